@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from PIL import Image
-import os
+
+import cache_dados
+import concentracao_exposicao
+import correlacao_segmentos
+import cubo_agregados
+import diagnostico
+import exportacao
+import graficos
+import hierarquia_cnae
+import indice_filtros
+import motores_analise
+import score_pagadores
+import serie_temporal
+import varredura_limiares
 
 # --- Configuração da página ---
 st.set_page_config(
@@ -15,57 +24,154 @@ st.set_page_config(
 )
 
 # --- Função para carregar e preparar os dados ---
-@st.cache_data
-def load_and_prepare_data():
+# cache_resource: um único objeto por processo, compartilhado por todas as sessões e reruns
+# (cache_data devolveria uma cópia desserializada a cada rerun). As páginas não devem alterá-lo.
+# A chave é a versão corrente: uma carga incremental publicada troca a versão e os dados
+# são relidos do cache no próximo rerun, sem reiniciar o app.
+@st.cache_resource(max_entries=2)
+def load_and_prepare_data(versao):
     try:
-        df_boletos = pd.read_csv('base_boletos_fiap(in).csv', sep=',')
-        df_auxiliar = pd.read_csv('base_auxiliar_fiap(in).csv', sep=',')
+        return cache_dados.load_prepared_data()
     except Exception as e:
         st.error(f"Erro ao carregar os arquivos: {e}")
         return None
 
-    # Renomear coluna para merge
-    df_auxiliar.rename(columns={'id_cnpj': 'id_pagador'}, inplace=True)
+# Último cubo e últimas estatísticas de correlação calculados ({nome: (versão, objeto)}), para
+# atualizar em vez de recalcular após uma carga incremental
+@st.cache_resource
+def latest_aggregates():
+    return {}
 
-    # Conversão de colunas de data
-    date_cols = ['dt_emissao', 'dt_vencimento', 'dt_pagamento']
-    for col in date_cols:
-        df_boletos[col] = pd.to_datetime(df_boletos[col], errors='coerce')
+# Cubo de agregados calculado uma vez por versão dos dados e compartilhado pelas páginas
+@st.cache_resource(max_entries=2)
+def load_cube(versao, _dados):
+    ultimo = latest_aggregates()
+    cubo = cubo_agregados.cube_for(_dados, ultimo.get('cubo'))
+    ultimo['cubo'] = (versao, cubo)
+    return cubo
 
-    # Preenchimento de valores faltantes e merge
-    df_boletos['tipo_baixa'] = df_boletos['tipo_baixa'].fillna('Em Aberto')
-    df_boletos['vlr_baixa'] = df_boletos['vlr_baixa'].fillna(0)
-    df_merged = pd.merge(df_boletos, df_auxiliar, on='id_pagador', how='left')
+# Estatísticas suficientes das correlações por segmento (UF, CNAE, mês, espécie), uma por versão
+@st.cache_resource(max_entries=2)
+def load_correlation(versao, _dados):
+    ultimo = latest_aggregates()
+    engine = correlacao_segmentos.engine_for(_dados, ultimo.get('correlacao'))
+    ultimo['correlacao'] = (versao, engine)
+    return engine
 
-    # Criação de Variáveis Chave
-    def get_payment_status(row):
-        if row['tipo_baixa'] == 'Em Aberto':
-            return 'Em Aberto'
-        if row['dt_pagamento'] > row['dt_vencimento']:
-            return 'Pago Atrasado'
-        return 'Pago em Dia'
+# Hierarquia CNAE com contagens e volumes pré-agregados em cada nível, a partir das medidas por
+# pagador do cubo: o detalhamento e o mínimo de boletos não releem os boletos
+@st.cache_resource(max_entries=2)
+def load_cnae_hierarchy(versao, _dados):
+    return hierarquia_cnae.build_hierarchy(load_cube(versao, _dados).pagadores, _dados.pagadores)
 
-    df_merged['status_pagamento'] = df_merged.apply(get_payment_status, axis=1)
-    df_merged['dias_atraso'] = (df_merged['dt_pagamento'] - df_merged['dt_vencimento']).dt.days
-    df_merged['dias_atraso'] = df_merged['dias_atraso'].apply(lambda x: x if x > 0 else 0)
-    df_merged['inadimplente'] = df_merged['status_pagamento'].apply(lambda x: 1 if x == 'Em Aberto' else 0)
-    
-    return df_merged
+# Indicadores por pagador ordenados para a varredura de limiares (casos extremos e grupos de risco)
+@st.cache_resource(max_entries=2)
+def load_threshold_sweep(versao, _dados):
+    return varredura_limiares.build_sweep(load_cube(versao, _dados).pagadores)
+
+# Score de risco por pagador: lido do disco por versão ou, após uma carga incremental,
+# recalculado só para os pagadores com boletos alterados
+@st.cache_resource(max_entries=2)
+def load_scores(versao, _dados):
+    return score_pagadores.scores_for(_dados)
+
+# Matriz esparsa pagador × beneficiário (valor nominal e valor em aberto), uma por versão dos dados
+@st.cache_resource(max_entries=2)
+def load_exposure(versao, _dados):
+    return concentracao_exposicao.build_exposure(_dados)
+
+# Séries temporais (arrays acumulados por dia de emissão e curvas de safra), uma por versão dos dados
+@st.cache_resource(max_entries=2)
+def load_time_series(versao, _dados):
+    return serie_temporal.build_time_series(_dados.fact_columns(serie_temporal.FACT_COLS))
+
+# Índices de filtro da página de dados detalhados, também um por versão dos dados.
+# UF e CNAE são atributos do pagador: só essas colunas são buscadas na dimensão de pagadores.
+@st.cache_resource(max_entries=2)
+def load_filter_index(versao, _dados):
+    return indice_filtros.FilterIndex(_dados.with_payer_columns(_dados.boletos, cubo_agregados.PAYER_DIMS))
+
+# Imagens dos gráficos já renderizadas, compartilhadas entre sessões (LRU)
+@st.cache_resource
+def chart_cache():
+    return graficos.ChartCache()
+
+def show_chart(chart_id, draw, **params):
+    png = chart_cache().render(dados.versao, chart_id, draw, **params)
+    st.image(png, use_container_width=True)
+
+def segment_correlation(cols, key):
+    # Matriz de correlação do segmento escolhido (união dos valores marcados; vazio = todos os pagadores)
+    engine = load_correlation(dados.versao, dados)
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        dim = st.selectbox(
+            "Segmentar por:", [None] + list(correlacao_segmentos.SEGMENT_DIMS), key=f"{key}_dimensao",
+            format_func=lambda d: "Todos os pagadores" if d is None else correlacao_segmentos.SEGMENT_DIMS[d]
+        )
+    values = None
+    if dim is not None:
+        with col2:
+            values = st.multiselect("Segmentos (união):", engine.values(dim), key=f"{key}_{dim}", format_func=str) or None
+    unidade = "pares pagador × segmento" if dim not in (None, *correlacao_segmentos.PAYER_DIMS) else "pagadores"
+    st.caption(f"{engine.support(dim or 'uf', values):,} {unidade} na seleção")
+    return engine.correlation(cols, dim or 'uf', values)
+
+def display_rows(df_rows):
+    # Linhas para exibição/exportação: todos os atributos do pagador e identificadores em hexadecimal
+    return dados.decode_ids(dados.with_payer_columns(df_rows))
+
+def served_version():
+    # Sem versão publicada (primeira execução), os dados são preparados e publicados antes da
+    # carga em cache: a chave já nasce estável e o dataset não fica carregado duas vezes
+    # (sob None e sob a versão publicada). O objeto preparado aqui é descartado; a carga lê o cache.
+    versao = cache_dados.current_version()
+    if versao is None:
+        try:
+            cache_dados.load_prepared_data()
+        except Exception:
+            # O erro é exibido pela carga em load_and_prepare_data
+            return None
+        versao = cache_dados.current_version()
+    return versao
 
 # Carregar dados
-df = load_and_prepare_data()
+dados = load_and_prepare_data(served_version())
 
-if df is None:
+if dados is None:
     st.stop()
 
+# Colunas dos fatos lidas por cada página (o cache é lido por projeção, coluna a coluna);
+# None = todas. O cubo e o motor de análise leem as suas próprias colunas, só quando usados.
+PAGE_COLUMNS = {
+    "🏠 Home": ['vlr_nominal', 'inadimplente'],
+    "📊 Análise Exploratória": ['vlr_nominal', 'vlr_baixa'],
+    "🔍 Análises de Aprofundamento": ['vlr_nominal', 'inadimplente'],
+    "⚠️ Indicadores de Risco": [],
+    "💧 Indicadores de Liquidez": [],
+    "🔗 Concentração": [],
+    "📈 Dados Detalhados": None,
+}
+
 # --- Sidebar ---
 st.sidebar.title("📋 Navegação")
 page = st.sidebar.radio(
     "Selecione uma seção:",
     ["🏠 Home", "📊 Análise Exploratória", "🔍 Análises de Aprofundamento", 
-     "⚠️ Indicadores de Risco", "💧 Indicadores de Liquidez", "📈 Dados Detalhados"]
+     "⚠️ Indicadores de Risco", "💧 Indicadores de Liquidez", "🔗 Concentração", "📈 Dados Detalhados"]
 )
 
+# Identificadores chegam como códigos inteiros; o hexadecimal só é decodificado para exibição
+df = dados.boletos if PAGE_COLUMNS[page] is None else dados.fact_columns(PAGE_COLUMNS[page])
+
+# Tempo e memória de cada seção da página (painel de diagnóstico na sidebar)
+secoes = diagnostico.SectionTimer(f"{page} / ")
+secoes.start("cabeçalho")
+
+def section(title):
+    secoes.start(title)
+    st.subheader(title)
+
 # --- HOME ---
 if page == "🏠 Home":
     st.title("📊 Relatório de Análise Exploratória de Dados (EDA)")
@@ -75,9 +181,9 @@ if page == "🏠 Home":
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total de Boletos", f"{len(df):,}")
+        st.metric("Total de Boletos", f"{len(df):,.0f}")
     with col2:
-        st.metric("Taxa de Inadimplência", f"{(df['inadimplente'].mean() * 100):.2f}%")
+        st.metric("Taxa de Inadimplência", f"{df['inadimplente'].mean() * 100:.2f}%")
     with col3:
         st.metric("Valor Total Nominal", f"R$ {df['vlr_nominal'].sum():,.2f}")
     
@@ -99,7 +205,8 @@ if page == "🏠 Home":
     2. **Análises de Aprofundamento**: Outliers, análise temporal e impacto do CNAE
     3. **Indicadores de Risco**: Análise de scores e indicadores de risco adicionais
     4. **Indicadores de Liquidez**: Análise de liquidez de 1 mês (sacado e cedente)
-    5. **Dados Detalhados**: Visualização e download dos dados processados
+    5. **Concentração**: Concentração e exposição entre pagadores e beneficiários
+    6. **Dados Detalhados**: Visualização e download dos dados processados
     
     ### 📊 Principais Descobertas
     - **69.70%** dos boletos foram pagos em dia
@@ -113,22 +220,18 @@ if page == "🏠 Home":
 elif page == "📊 Análise Exploratória":
     st.title("📊 Análise Exploratória de Dados (EDA)")
     
+    cubo = load_cube(dados.versao, dados)
+    
     st.markdown("---")
     
     # Seção 1: Distribuição do Status de Pagamento
-    st.subheader("1️⃣ Distribuição do Status de Pagamento")
+    section("1️⃣ Distribuição do Status de Pagamento")
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        status_counts = df['status_pagamento'].value_counts(normalize=True) * 100
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.barplot(x=status_counts.index, y=status_counts.values, palette="viridis", ax=ax)
-        ax.set_title('Distribuição do Status de Pagamento dos Boletos')
-        ax.set_ylabel('Percentual (%)')
-        ax.set_xlabel('Status de Pagamento')
-        plt.xticks(rotation=45, ha='right')
-        st.pyplot(fig)
+        status_counts = cubo.status_distribution()
+        show_chart('status_pagamento', lambda: graficos.status_distribution(status_counts))
     
     with col2:
         st.metric("Pago em Dia", f"{status_counts['Pago em Dia']:.2f}%")
@@ -138,7 +241,7 @@ elif page == "📊 Análise Exploratória":
     st.markdown("---")
     
     # Seção 2: Análise de Valores
-    st.subheader("2️⃣ Análise de Valores Nominais e de Baixa")
+    section("2️⃣ Análise de Valores Nominais e de Baixa")
     
     col1, col2 = st.columns(2)
     
@@ -165,42 +268,38 @@ elif page == "📊 Análise Exploratória":
     
     with col2:
         st.write("**Distribuição de Valores:**")
-        fig, ax = plt.subplots(figsize=(8, 5))
-        ax.hist(df['vlr_nominal'], bins=50, alpha=0.7, label='Valor Nominal', edgecolor='black')
-        ax.set_xlabel('Valor (R$)')
-        ax.set_ylabel('Frequência')
-        ax.set_title('Distribuição de Valores Nominais')
-        ax.legend()
-        st.pyplot(fig)
+        show_chart('histograma_vlr_nominal', lambda bins: graficos.value_histogram(df['vlr_nominal'], bins), bins=50)
     
     st.markdown("---")
     
     # Seção 3: Inadimplência por Tipo de Espécie
-    st.subheader("3️⃣ Inadimplência por Tipo de Espécie")
+    section("3️⃣ Inadimplência por Tipo de Espécie")
     
-    inadimplencia_por_especie = df.groupby('tipo_especie')['inadimplente'].mean().sort_values(ascending=False) * 100
+    inadimplencia_por_especie = cubo.default_rate_by('tipo_especie').sort_values(ascending=False)
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.barplot(x=inadimplencia_por_especie.head(10).index, y=inadimplencia_por_especie.head(10).values, palette="rocket", ax=ax)
-    ax.set_title('Top 10 Tipos de Espécie com Maior Potencial de Inadimplência')
-    ax.set_ylabel('Percentual de Boletos "Em Aberto" (%)')
-    ax.set_xlabel('Tipo de Espécie')
-    plt.xticks(rotation=45, ha='right')
-    st.pyplot(fig)
+    show_chart('inadimplencia_por_especie', lambda: graficos.top_default_rate(
+        inadimplencia_por_especie,
+        title='Top 10 Tipos de Espécie com Maior Potencial de Inadimplência',
+        xlabel='Tipo de Espécie',
+        ylabel='Percentual de Boletos "Em Aberto" (%)',
+        palette="rocket"
+    ))
 
 # --- ANÁLISES DE APROFUNDAMENTO ---
 elif page == "🔍 Análises de Aprofundamento":
     st.title("🔍 Análises de Aprofundamento")
     
+    cubo = load_cube(dados.versao, dados)
+    
     st.markdown("---")
     
     # Seção 1: Outliers
-    st.subheader("1️⃣ Análise de Outliers (Alto Valor)")
+    section("1️⃣ Análise de Outliers (Alto Valor)")
     
-    p99_nominal = df['vlr_nominal'].quantile(0.99)
+    p99_nominal = cubo.value_quantile(0.99)
     df_outliers = df[df['vlr_nominal'] > p99_nominal]
     outlier_inadimplencia = df_outliers['inadimplente'].mean() * 100
-    taxa_geral = df['inadimplente'].mean() * 100
+    taxa_geral = cubo.default_rate_total()
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -211,153 +310,300 @@ elif page == "🔍 Análises de Aprofundamento":
         st.metric("Taxa Geral", f"{taxa_geral:.2f}%")
     
     st.info(f"⚠️ Boletos de alto valor têm risco **{outlier_inadimplencia/taxa_geral:.1f}x maior** que a média!")
-    
+
+    with st.expander("Percentis do Valor Nominal por Tipo de Espécie"):
+        percentis = pd.concat([cubo.value_quantiles_by('tipo_especie', q) for q in [0.5, 0.9, 0.99]], axis=1)
+        st.dataframe(percentis.style.format("R$ {:,.2f}"), use_container_width=True)
+
     st.markdown("---")
     
     # Seção 2: Análise Temporal
-    st.subheader("2️⃣ Análise Temporal da Inadimplência")
-    
-    df['mes_emissao'] = df['dt_emissao'].dt.to_period('M')
-    inadimplencia_mensal = df.groupby('mes_emissao')['inadimplente'].mean() * 100
-    inadimplencia_mensal_plot = inadimplencia_mensal.reset_index()
-    inadimplencia_mensal_plot['mes_emissao'] = inadimplencia_mensal_plot['mes_emissao'].astype(str)
+    section("2️⃣ Análise Temporal da Inadimplência")
     
-    fig, ax = plt.subplots(figsize=(12, 6))
-    ax.plot(inadimplencia_mensal_plot['mes_emissao'], inadimplencia_mensal_plot['inadimplente'], marker='o', linewidth=2)
-    ax.set_title('Evolução Mensal da Taxa de Boletos "Em Aberto" (Potencial Inadimplência)')
-    ax.set_ylabel('Taxa de Inadimplência (%)')
-    ax.set_xlabel('Mês de Emissão')
-    plt.xticks(rotation=45, ha='right')
-    st.pyplot(fig)
+    serie = load_time_series(dados.versao, dados)
     
-    st.warning("⚠️ Pico de inadimplência detectado em **Maio/2024** (4.61%)")
+    col1, col2 = st.columns(2)
+    with col1:
+        granularidade = st.radio("Granularidade:", list(serie_temporal.GRANULARITIES), index=2,
+                                 format_func=serie_temporal.GRANULARITIES.get, horizontal=True)
+    with col2:
+        janela = st.slider("Janela móvel (períodos):", 1, 12, 1)
+    
+    taxas = serie.default_rate(granularidade, janela)
+    picos = serie.detect_peaks(granularidade, janela)
+    rotulo = serie_temporal.GRANULARITIES[granularidade]
+    show_chart('inadimplencia_mensal', lambda granularidade, janela: graficos.monthly_default_rate(
+        taxas,
+        title=f'Evolução {rotulo} da Taxa de Boletos "Em Aberto" (Potencial Inadimplência)'
+              + (f' - Janela Móvel de {janela} Períodos' if janela > 1 else ''),
+        xlabel='Período de Emissão',
+        peaks=picos.index,
+        max_ticks=36
+    ), granularidade=granularidade, janela=janela)
+    
+    if picos.empty:
+        st.info(f"Nenhum pico de inadimplência detectado na série {rotulo.lower()}.")
+    else:
+        pico = picos.index[0]
+        st.warning(f"⚠️ Pico de inadimplência detectado em **{serie_temporal.format_period(pico)}** "
+                   f"({picos['taxa_inadimplencia'].iloc[0]:.2f}%)")
+        if len(picos) > 1:
+            outros = ', '.join(f"{serie_temporal.format_period(periodo)} ({taxa:.2f}%)"
+                               for periodo, taxa in picos['taxa_inadimplencia'].iloc[1:].items())
+            st.caption(f"Outros períodos atípicos: {outros}")
+    
+    st.write("**Curvas de Safra (Mês de Emissão × Dias de Atraso):**")
+    max_dias = st.slider("Dias após o vencimento:", 5, serie_temporal.MAX_DIAS_ATRASO, 60, step=5)
+    curvas = serie.vintage(max_dias)
+    show_chart('curvas_safra', lambda max_dias: graficos.vintage_curves(curvas), max_dias=max_dias)
     
     st.markdown("---")
     
     # Seção 3: Impacto do CNAE
-    st.subheader("3️⃣ Impacto do CNAE (Classificação Nacional de Atividades Econômicas)")
-    
-    df['cnae_4digitos'] = df['cd_cnae_prin'].astype(str).str[:4]
-    cnae_counts = df['cnae_4digitos'].value_counts()
-    cnae_validos = cnae_counts[cnae_counts >= 50].index
-    df_cnae = df[df['cnae_4digitos'].isin(cnae_validos)]
-    inadimplencia_por_cnae = df_cnae.groupby('cnae_4digitos')['inadimplente'].mean() * 100
-    
-    fig, ax = plt.subplots(figsize=(12, 6))
-    inadimplencia_por_cnae_top = inadimplencia_por_cnae.sort_values(ascending=False).head(10)
-    sns.barplot(x=inadimplencia_por_cnae_top.index, y=inadimplencia_por_cnae_top.values, palette="cubehelix", ax=ax)
-    ax.set_title('Top 10 CNAEs (4 Dígitos) com Maior Taxa de Potencial Inadimplência')
-    ax.set_ylabel('Taxa de Inadimplência (%)')
-    ax.set_xlabel('CNAE (4 Primeiros Dígitos)')
-    plt.xticks(rotation=45, ha='right')
-    st.pyplot(fig)
+    section("3️⃣ Impacto do CNAE (Classificação Nacional de Atividades Econômicas)")
+    
+    hierarquia = load_cnae_hierarchy(dados.versao, dados)
+    niveis = hierarquia_cnae.CNAE_LEVELS
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        nivel = st.selectbox("Nível da CNAE:", niveis, index=niveis.index('classe'), format_func=hierarquia_cnae.LEVEL_LABELS.get)
+    with col2:
+        min_boletos = st.slider("Mínimo de boletos por segmento:", 1, 500, 50)
+    
+    # Detalhamento: cada nível acima do escolhido pode restringir os segmentos exibidos
+    pai = None
+    niveis_acima = niveis[:niveis.index(nivel)]
+    for coluna, nivel_acima in zip(st.columns(max(len(niveis_acima), 1)), niveis_acima):
+        opcoes = [None] + hierarquia.children(nivel_acima, pai)
+        escolha = coluna.selectbox(
+            f"{hierarquia_cnae.LEVEL_LABELS[nivel_acima]}:", opcoes, key=f"cnae_{nivel_acima}_{pai}",
+            format_func=lambda code, n=nivel_acima: "Todas" if code is None else hierarquia_cnae.format_code(n, code)
+        )
+        if escolha is None:
+            break
+        pai = (nivel_acima, escolha)
+    
+    segmentos = hierarquia.rollup(nivel, pai, min_boletos)
+    segmentos['taxa_inadimplencia'] = segmentos['inadimplentes'] / segmentos['boletos'] * 100
+    segmentos = segmentos.sort_values('taxa_inadimplencia', ascending=False)
+    segmentos.index = [hierarquia_cnae.format_code(nivel, code) for code in segmentos.index]
+    rotulo = hierarquia_cnae.LEVEL_LABELS[nivel]
+    
+    if segmentos.empty:
+        st.info("Nenhum segmento com o mínimo de boletos escolhido.")
+    else:
+        show_chart('inadimplencia_por_cnae', lambda nivel, pai, min_boletos: graficos.top_default_rate(
+            segmentos['taxa_inadimplencia'],
+            title=f'Top 10 CNAEs ({rotulo}) com Maior Taxa de Potencial Inadimplência',
+            xlabel=f'CNAE ({rotulo})',
+            ylabel='Taxa de Inadimplência (%)',
+            palette="cubehelix",
+            figsize=(12, 6)
+        ), nivel=nivel, pai=pai, min_boletos=min_boletos)
+        
+        with st.expander(f"Boletos, volume e inadimplência por {rotulo.lower()}"):
+            st.dataframe(segmentos.style.format({
+                'boletos': "{:,.0f}",
+                'vlr_nominal': "R$ {:,.2f}",
+                'inadimplentes': "{:,.0f}",
+                'taxa_inadimplencia': "{:.2f}%",
+            }), use_container_width=True)
 
 # --- INDICADORES DE RISCO ---
 elif page == "⚠️ Indicadores de Risco":
     st.title("⚠️ Indicadores de Risco")
     
+    cubo = load_cube(dados.versao, dados)
+    
     st.markdown("---")
     
     # Agregação por Pagador
-    df_pagador_agg = df.groupby('id_pagador').agg(
-        taxa_inadimplencia=('inadimplente', 'mean'),
-        share_vl_inad_pag_bol_6_a_15d=('share_vl_inad_pag_bol_6_a_15d', 'mean'),
-        indicador_liquidez_quantitativo_3m=('indicador_liquidez_quantitativo_3m', 'mean'),
-        score_materialidade_evolucao=('score_materialidade_evolucao', 'mean'),
-        score_materialidade=('score_materialidade_v2', 'mean'),
-        score_quantidade=('score_quantidade_v2', 'mean')
-    ).reset_index()
-    
-    df_pagador_agg['alto_risco'] = df_pagador_agg['taxa_inadimplencia'].apply(lambda x: 'Alto Risco' if x > 0 else 'Baixo Risco')
+    df_pagador_agg = cubo.payer_aggregate([
+        'share_vl_inad_pag_bol_6_a_15d',
+        'indicador_liquidez_quantitativo_3m',
+        'score_materialidade_evolucao',
+        'score_materialidade',
+        'score_quantidade'
+    ])
+    
+    # Grupo de risco: taxa de inadimplência acima do limite escolhido
+    varredura = load_threshold_sweep(dados.versao, dados)
+    limite_risco = st.select_slider(
+        "Alto Risco: taxa de inadimplência acima de", options=list(varredura_limiares.LIMITES_TAXA), value=0.0,
+        format_func=lambda v: f"{v:.0%}"
+    )
+    df_pagador_agg['alto_risco'] = df_pagador_agg['taxa_inadimplencia'].gt(limite_risco).map({True: 'Alto Risco', False: 'Baixo Risco'})
+    st.caption(f"{varredura.high_risk([limite_risco]).iloc[0]:,} pagadores no grupo Alto Risco")
     
-    st.subheader("1️⃣ Correlação de Indicadores com Inadimplência")
+    section("1️⃣ Correlação de Indicadores com Inadimplência")
     
     cols_analise = ['taxa_inadimplencia', 'share_vl_inad_pag_bol_6_a_15d', 
                     'indicador_liquidez_quantitativo_3m', 'score_materialidade_evolucao']
-    correlation = df_pagador_agg[cols_analise].corr()
+    correlation = segment_correlation(cols_analise, 'risco')
     
     st.write("**Matriz de Correlação:**")
     st.dataframe(correlation, use_container_width=True)
     
     st.markdown("---")
     
-    st.subheader("2️⃣ Boxplots por Grupo de Risco")
+    section("2️⃣ Boxplots por Grupo de Risco")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
         st.write("**Share de Atraso 6-15 dias**")
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='alto_risco', y='share_vl_inad_pag_bol_6_a_15d', data=df_pagador_agg.dropna(), ax=ax)
-        ax.set_title('Por Grupo de Risco')
-        st.pyplot(fig)
+        show_chart('risco_boxplot', lambda col, limite: graficos.risk_boxplot(df_pagador_agg.dropna(), col), limite=limite_risco, col='share_vl_inad_pag_bol_6_a_15d')
     
     with col2:
         st.write("**Liquidez Quantitativa 3M**")
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='alto_risco', y='indicador_liquidez_quantitativo_3m', data=df_pagador_agg.dropna(), ax=ax)
-        ax.set_title('Por Grupo de Risco')
-        st.pyplot(fig)
+        show_chart('risco_boxplot', lambda col, limite: graficos.risk_boxplot(df_pagador_agg.dropna(), col), limite=limite_risco, col='indicador_liquidez_quantitativo_3m')
     
     with col3:
         st.write("**Score Materialidade Evolução**")
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='alto_risco', y='score_materialidade_evolucao', data=df_pagador_agg.dropna(), ax=ax)
-        ax.set_title('Por Grupo de Risco')
-        st.pyplot(fig)
+        show_chart('risco_boxplot', lambda col, limite: graficos.risk_boxplot(df_pagador_agg.dropna(), col), limite=limite_risco, col='score_materialidade_evolucao')
+    
+    st.markdown("---")
+    
+    section("3️⃣ Score de Risco por Pagador")
+    
+    scores = load_scores(dados.versao, dados)
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.write("**Coeficientes do Modelo (Variáveis Padronizadas):**")
+        st.dataframe(scores.modelo.coefficients().style.format("{:.3f}"), use_container_width=True)
+    
+    with col2:
+        n_top = st.slider("Pagadores de maior risco:", 10, 100, 20)
+        st.dataframe(dados.decode_ids(scores.top(n_top).reset_index()), use_container_width=True)
+    
+    st.info("💡 Probabilidade de um boleto do pagador ficar em aberto (regressão logística sobre os indicadores e o histórico de pagamento); score 1000 = menor risco.")
 
 # --- INDICADORES DE LIQUIDEZ ---
 elif page == "💧 Indicadores de Liquidez":
     st.title("💧 Indicadores de Liquidez de 1 Mês")
     
+    cubo = load_cube(dados.versao, dados)
+    
     st.markdown("---")
     
     # Agregação por Pagador
-    df_pagador_agg = df.groupby('id_pagador').agg(
-        taxa_inadimplencia=('inadimplente', 'mean'),
-        sacado_indice_liquidez_1m=('sacado_indice_liquidez_1m', 'mean'),
-        cedente_indice_liquidez_1m=('cedente_indice_liquidez_1m', 'mean')
-    ).reset_index()
+    df_pagador_agg = cubo.payer_aggregate(['sacado_indice_liquidez_1m', 'cedente_indice_liquidez_1m'])
     
-    df_pagador_agg['alto_risco'] = df_pagador_agg['taxa_inadimplencia'].apply(lambda x: 'Alto Risco' if x > 0 else 'Baixo Risco')
+    df_pagador_agg['alto_risco'] = df_pagador_agg['taxa_inadimplencia'].gt(0).map({True: 'Alto Risco', False: 'Baixo Risco'})
     
-    st.subheader("1️⃣ Correlação com Inadimplência")
+    section("1️⃣ Correlação com Inadimplência")
     
     cols_liquidez = ['taxa_inadimplencia', 'sacado_indice_liquidez_1m', 'cedente_indice_liquidez_1m']
-    correlation_liquidez = df_pagador_agg[cols_liquidez].corr()
+    correlation_liquidez = segment_correlation(cols_liquidez, 'liquidez')
     
     st.write("**Matriz de Correlação:**")
     st.dataframe(correlation_liquidez, use_container_width=True)
     
     st.markdown("---")
     
-    st.subheader("2️⃣ Boxplots por Grupo de Risco")
+    section("2️⃣ Boxplots por Grupo de Risco")
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.write("**Liquidez Sacado (Pagador) - 1 Mês**")
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='alto_risco', y='sacado_indice_liquidez_1m', data=df_pagador_agg.dropna(), ax=ax)
-        ax.set_title('Por Grupo de Risco')
-        st.pyplot(fig)
+        show_chart('liquidez_boxplot', lambda col: graficos.risk_boxplot(df_pagador_agg.dropna(), col), col='sacado_indice_liquidez_1m')
     
     with col2:
         st.write("**Liquidez Cedente - 1 Mês**")
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='alto_risco', y='cedente_indice_liquidez_1m', data=df_pagador_agg.dropna(), ax=ax)
-        ax.set_title('Por Grupo de Risco')
-        st.pyplot(fig)
+        show_chart('liquidez_boxplot', lambda col: graficos.risk_boxplot(df_pagador_agg.dropna(), col), col='cedente_indice_liquidez_1m')
     
     st.markdown("---")
     
-    st.subheader("3️⃣ Análise de Casos Extremos")
+    section("3️⃣ Análise de Casos Extremos")
+    
+    # Contagens de toda a grade de limiares calculadas de uma vez; os sliders só consultam a grade
+    varredura = load_threshold_sweep(dados.versao, dados)
+    grade = varredura.grid()
     
-    df_pagador_agg['sacado_liquidez_baixa'] = df_pagador_agg['sacado_indice_liquidez_1m'] < 0.5
-    df_extremos = df_pagador_agg[(df_pagador_agg['sacado_liquidez_baixa'] == True) & (df_pagador_agg['alto_risco'] == 'Baixo Risco')]
+    col1, col2 = st.columns(2)
+    with col1:
+        limite_liquidez = st.select_slider(
+            "Liquidez do sacado abaixo de:", options=list(grade.index), value=motores_analise.LIMITE_LIQUIDEZ_BAIXA,
+            format_func=lambda v: f"{v:.0%}"
+        )
+    with col2:
+        limite_taxa = st.select_slider(
+            "Taxa de inadimplência até:", options=list(grade.columns), value=0.0, format_func=lambda v: f"{v:.0%}"
+        )
+    n_extremos = grade.loc[limite_liquidez, limite_taxa]
     
-    st.success(f"✅ Identificados **{len(df_extremos)}** pagadores com liquidez baixa (< 50%) mas sem inadimplência atual.")
+    if limite_taxa == 0:
+        st.success(f"✅ Identificados **{n_extremos}** pagadores com liquidez baixa (< {limite_liquidez:.0%}) mas sem inadimplência atual.")
+    else:
+        st.success(f"✅ Identificados **{n_extremos}** pagadores com liquidez baixa (< {limite_liquidez:.0%}) "
+                   f"e taxa de inadimplência até {limite_taxa:.0%}.")
     st.info("💡 Estes representam um risco iminente ou uma oportunidade de renegociação.")
+    
+    with st.expander("Varredura de limiares (todas as combinações)"):
+        show_chart('varredura_limiares', lambda: graficos.threshold_heatmap(grade))
+
+# --- CONCENTRAÇÃO ---
+elif page == "🔗 Concentração":
+    st.title("🔗 Concentração Pagador × Beneficiário")
+    
+    exposicao = load_exposure(dados.versao, dados)
+    
+    st.markdown("---")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Pares Pagador × Beneficiário", f"{exposicao.n_pairs:,}")
+    with col2:
+        st.metric("HHI entre Beneficiários", f"{exposicao.portfolio_hhi('beneficiario'):.4f}")
+    with col3:
+        st.metric("HHI entre Pagadores", f"{exposicao.portfolio_hhi('pagador'):.4f}")
+    
+    st.markdown("---")
+    
+    section("1️⃣ Concentração por Beneficiário e por Pagador")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        por = st.radio("Concentração de cada:", list(concentracao_exposicao.AXES), format_func=concentracao_exposicao.AXES.get, horizontal=True)
+    with col2:
+        medida = st.radio("Medida:", list(concentracao_exposicao.MEASURES), format_func=concentracao_exposicao.MEASURES.get, horizontal=True)
+    with col3:
+        top_n = st.slider("N maiores contrapartes:", 1, 20, concentracao_exposicao.TOP_N)
+    
+    # A ordenação das contrapartes é feita uma vez por matriz; mudar N só refaz uma soma
+    concentracao = exposicao.concentration(por, medida, top_n)
+    st.caption(f"{len(concentracao):,} {'beneficiários' if por == 'beneficiario' else 'pagadores'} com valor; "
+               f"mediana do HHI: {concentracao['hhi'].median():.3f}")
+    st.dataframe(dados.decode_ids(concentracao.nlargest(50, 'valor').reset_index()), use_container_width=True)
+    
+    st.info("💡 HHI = soma dos quadrados das participações das contrapartes (1 = uma única contraparte). "
+            "Contrapartes equivalentes = 1 / HHI.")
+    
+    st.markdown("---")
+    
+    section("2️⃣ Exposição a Pagadores com Boletos em Aberto")
+    
+    exposicao_aberto = exposicao.open_payer_exposure()
+    share_total = exposicao_aberto['exposicao_pagadores_em_aberto'].sum() / exposicao_aberto['vlr_nominal'].sum()
+    st.write(f"**{share_total:.2%}** do valor nominal da carteira é devido por pagadores com algum boleto em aberto.")
+    
+    maiores = dados.decode_ids(exposicao_aberto.nlargest(50, 'exposicao_pagadores_em_aberto').reset_index())
+    # Rótulos curtos: prefixo do identificador hexadecimal
+    exposicao_top = maiores.set_index(maiores['id_beneficiario'].str[:8])['exposicao_pagadores_em_aberto'] / 1e6
+    show_chart('exposicao_pagadores_em_aberto', lambda: graficos.top_default_rate(
+        exposicao_top, 'Top 10 Beneficiários por Exposição a Pagadores com Boletos em Aberto',
+        'Beneficiário (prefixo do identificador)', 'Exposição (R$ milhões)', 'flare', figsize=(12, 6)
+    ))
+    
+    with st.expander("Beneficiários com maior exposição"):
+        st.dataframe(maiores, use_container_width=True)
+    
+    st.info("💡 A exposição soma o valor nominal dos boletos do beneficiário com pagadores que têm boleto em aberto "
+            "em qualquer beneficiário: o risco de contágio de um sacado inadimplente para os cedentes.")
 
 # --- DADOS DETALHADOS ---
 elif page == "📈 Dados Detalhados":
@@ -365,46 +611,99 @@ elif page == "📈 Dados Detalhados":
     
     st.markdown("---")
     
-    st.subheader("1️⃣ Visualizar Dados Brutos")
+    section("1️⃣ Visualizar Dados Brutos")
     
     num_rows = st.slider("Número de linhas a exibir:", 10, 100, 20)
-    st.dataframe(df.head(num_rows), use_container_width=True)
+    st.dataframe(display_rows(df.head(num_rows)), use_container_width=True)
     
     st.markdown("---")
     
-    st.subheader("2️⃣ Filtrar Dados")
+    section("2️⃣ Filtrar Dados")
+    
+    indice = load_filter_index(dados.versao, dados)
     
     col1, col2 = st.columns(2)
     
     with col1:
         status_filter = st.multiselect(
             "Filtrar por Status de Pagamento:",
-            df['status_pagamento'].unique(),
-            default=df['status_pagamento'].unique()
+            indice.values('status_pagamento'),
+            default=indice.values('status_pagamento')
         )
+        uf_filter = st.multiselect("Filtrar por UF (vazio = todas):", sorted(indice.values('uf')))
+        mes_filter = st.multiselect("Filtrar por Mês de Emissão (vazio = todos):", sorted(indice.values('mes_emissao')))
     
     with col2:
         tipo_especie_filter = st.multiselect(
             "Filtrar por Tipo de Espécie:",
-            df['tipo_especie'].unique(),
-            default=df['tipo_especie'].unique()[:5]
+            indice.values('tipo_especie'),
+            default=indice.values('tipo_especie')[:5]
         )
+        cnae_filter = st.multiselect("Filtrar por CNAE 4 dígitos (vazio = todos):", sorted(indice.values('cnae_4digitos')))
+    
+    filtros = {
+        'status_pagamento': status_filter,
+        'tipo_especie': tipo_especie_filter,
+        'uf': uf_filter or None,
+        'cnae_4digitos': cnae_filter or None,
+        'mes_emissao': mes_filter or None,
+    }
+    posicoes = indice.select(filtros)
     
-    df_filtered = df[(df['status_pagamento'].isin(status_filter)) & (df['tipo_especie'].isin(tipo_especie_filter))]
+    st.write(f"**Total de registros filtrados:** {len(posicoes)}")
     
-    st.write(f"**Total de registros filtrados:** {len(df_filtered)}")
-    st.dataframe(df_filtered, use_container_width=True)
+    # Paginação no servidor: o navegador recebe só a página visível
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_by = st.selectbox("Ordenar por:", ["(ordem original)"] + list(indice.df.columns))
+    with col2:
+        ascending = st.radio("Ordem:", ["Crescente", "Decrescente"], horizontal=True) == "Crescente"
+    with col3:
+        page_size = st.selectbox("Linhas por página:", [25, 50, 100, 250], index=1)
+    with col4:
+        total_paginas = indice_filtros.n_pages(len(posicoes), page_size)
+        pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas, value=1)
+    
+    df_pagina = indice.page(
+        posicoes, sort_by=None if sort_by == "(ordem original)" else sort_by,
+        ascending=ascending, page=pagina, page_size=page_size
+    )
+    st.dataframe(display_rows(df_pagina), use_container_width=True)
     
     st.markdown("---")
     
-    st.subheader("3️⃣ Download de Dados")
+    section("3️⃣ Download de Dados")
     
-    csv = df_filtered.to_csv(index=False)
+    formatos = {"CSV compactado (.csv.gz)": 'csv.gz', "Parquet (colunar)": 'parquet'}
+    formato = formatos[st.radio("Formato:", list(formatos), horizontal=True)]
+    extensao, mime = exportacao.FORMATS[formato]
+    assinatura = exportacao.filter_signature(dados.versao, filtros)
+    
+    # O arquivo só é gerado no clique, em blocos, e reaproveitado para o mesmo filtro
     st.download_button(
-        label="📥 Baixar dados filtrados como CSV",
-        data=csv,
-        file_name="boletos_filtrados.csv",
-        mime="text/csv"
+        label="📥 Baixar dados filtrados",
+        data=lambda: exportacao.open_export(indice.df, posicoes, display_rows, assinatura, formato),
+        file_name=f"boletos_filtrados.{extensao}",
+        mime=mime,
+        on_click="ignore"
+    )
+
+secoes.end()
+
+# --- Diagnóstico ---
+if st.sidebar.checkbox("🩺 Diagnóstico"):
+    registros = diagnostico.records()
+    st.sidebar.caption(f"Últimas etapas medidas ({len(registros)} registros no processo)")
+    if registros:
+        st.sidebar.dataframe(
+            pd.DataFrame(registros[::-1])[['etapa', 'segundos', 'pico_mb', 'rss_mb', 'linhas']].head(50),
+            hide_index=True
+        )
+    st.sidebar.download_button(
+        label="📥 Exportar (JSON Lines)",
+        data=diagnostico.to_jsonl(registros),
+        file_name="diagnostico.jsonl",
+        mime="application/jsonl"
     )
 
 st.markdown("---")
@@ -0,0 +1,48 @@
+import argparse
+
+from benchmark_preparacao import resample_boletos
+from diagnostico import best_time
+from identificadores import ID_COLS, IdentifierDictionary
+from preparacao_dados import read_sources
+
+
+def memory_mb(df, cols):
+    return df[cols].memory_usage(deep=True, index=False).sum() / 2**20
+
+
+def measure(df, amostra_pagadores):
+    return {
+        'memória ids (MB)': memory_mb(df, ID_COLS),
+        "groupby('id_pagador') (s)": best_time(lambda: df.groupby('id_pagador')['vlr_nominal'].agg(['mean', 'sum', 'count'])),
+        'isin pagadores (s)': best_time(lambda: df['id_pagador'].isin(amostra_pagadores)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memória e tempo de groupby: identificadores hexadecimais x códigos.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    df_boletos, _ = read_sources()
+
+    for n_rows in args.linhas:
+        df_hex = resample_boletos(df_boletos, n_rows, args.seed)
+        df_codes = df_hex.copy()
+        for col in ID_COLS:
+            _, (df_codes[col],) = IdentifierDictionary.from_hex(df_hex[col])
+
+        pagadores_hex = df_hex['id_pagador'].drop_duplicates().sample(frac=0.1, random_state=args.seed)
+        pagadores_codes = df_codes.loc[pagadores_hex.index, 'id_pagador']
+
+        antes = measure(df_hex, pagadores_hex)
+        depois = measure(df_codes, pagadores_codes)
+
+        print(f"\n{n_rows:,} linhas")
+        print(f"{'métrica':<28} {'hex':>10} {'códigos':>10} {'ganho':>8}")
+        for metrica, valor in antes.items():
+            print(f"{metrica:<28} {valor:>10.3f} {depois[metrica]:>10.3f} {valor / depois[metrica]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
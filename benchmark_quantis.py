@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+
+from preparacao_dados import read_sources
+from sketch_quantis import RELATIVE_ACCURACY, QuantileSketch, sketch_of, sketches_by
+
+QUANTIS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+# Colunas numéricas das bases: valores monetários (>= 0) e indicadores com valores negativos
+BOLETOS_COLS = ['vlr_nominal', 'vlr_baixa']
+AUXILIAR_COLS = ['score_materialidade_v2', 'score_materialidade_evolucao', 'sacado_indice_liquidez_1m']
+
+
+def relative_errors(sketch, values, quantis=QUANTIS):
+    # Referência: quantil exato com interpolação linear, o mesmo de Series.quantile
+    values = values[~np.isnan(values)]
+    exatos = np.quantile(values, quantis)
+    aproximados = sketch.quantile(quantis)
+    return np.abs(aproximados - exatos) / np.maximum(np.abs(exatos), np.finfo(float).tiny)
+
+
+def check(nome, sketch, values, relative_accuracy):
+    erros = relative_errors(sketch, values)
+    maximo = erros.max()
+    ok = maximo <= relative_accuracy * (1 + 1e-9)
+    print(f"   {nome:<55} erro máx. {maximo:.5f} {'ok' if ok else 'FALHOU'}")
+    return ok
+
+
+def chunked_sketch(values, n_chunks, relative_accuracy):
+    # Um sketch por bloco, combinados no final, como numa ingestão particionada
+    merged = QuantileSketch(relative_accuracy)
+    for chunk in np.array_split(values, n_chunks):
+        merged.merge(sketch_of(chunk, relative_accuracy))
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precisão do sketch de quantis frente aos quantis exatos das bases.')
+    parser.add_argument('--precisao', type=float, nargs='+', default=[RELATIVE_ACCURACY, 0.01])
+    parser.add_argument('--blocos', type=int, default=7)
+    args = parser.parse_args()
+
+    df_boletos, df_auxiliar = read_sources()
+    colunas = {col: df_boletos[col].to_numpy(dtype=float) for col in BOLETOS_COLS}
+    colunas.update({col: df_auxiliar[col].to_numpy(dtype=float) for col in AUXILIAR_COLS})
+
+    ok = True
+    for relative_accuracy in args.precisao:
+        print(f"\nPrecisão relativa configurada: {relative_accuracy}")
+        for col, values in colunas.items():
+            inicio = time.perf_counter()
+            sketch = sketch_of(values, relative_accuracy)
+            segundos = time.perf_counter() - inicio
+            ok &= check(f"{col} ({segundos:.3f}s)", sketch, values, relative_accuracy)
+            ok &= check(f"{col} em {args.blocos} blocos combinados", chunked_sketch(values, args.blocos, relative_accuracy), values, relative_accuracy)
+
+        # Percentis por segmento: sketches por tipo de espécie, individualmente e combinados
+        especie = df_boletos['tipo_especie']
+        por_especie = sketches_by(df_boletos['vlr_nominal'], especie, relative_accuracy)
+        for tipo, sketch in por_especie.items():
+            ok &= check(f"vlr_nominal, espécie {tipo}", sketch, colunas['vlr_nominal'][(especie == tipo).to_numpy()], relative_accuracy)
+        todas = QuantileSketch(relative_accuracy)
+        for sketch in por_especie.values():
+            todas.merge(sketch)
+        ok &= check("vlr_nominal, todas as espécies combinadas", todas, colunas['vlr_nominal'][especie.notna().to_numpy()], relative_accuracy)
+
+    print("\nTodos os quantis dentro da precisão configurada." if ok else "\nHá quantis fora da precisão configurada.")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import score_pagadores
+from diagnostico import best_time
+from preparacao_dados import PAYER_INDICATORS
+
+# --- Benchmark do score de pagadores ---
+# Tabela por pagador sintética (indicadores com ~10% de nulos e histórico de boletos) com milhões
+# de pagadores: ajuste do modelo, score de todos os pagadores em lotes e o recálculo só dos
+# pagadores alterados por uma carga incremental.
+
+
+def synthetic_payers(n_payers, seed):
+    rng = np.random.default_rng(seed)
+    dimensao = pd.DataFrame(rng.random((n_payers, len(PAYER_INDICATORS))), columns=list(PAYER_INDICATORS.values()))
+    dimensao = dimensao.mask(rng.random(dimensao.shape) < 0.1)
+
+    boletos = rng.geometric(0.3, n_payers).astype('float64')
+    risco = 0.01 * np.exp(2 * dimensao.iloc[:, 0].fillna(0.5).to_numpy() - 1)
+    medidas = pd.DataFrame({
+        'boletos': boletos,
+        'inadimplentes': rng.binomial(boletos.astype('int64'), np.clip(risco, 0, 1)).astype('float64'),
+        'vlr_nominal': boletos * rng.lognormal(9, 1, n_payers),
+        'pagos_atrasados': rng.binomial(boletos.astype('int64'), 0.3).astype('float64'),
+        'dias_atraso': boletos * rng.exponential(3, n_payers),
+    }, index=pd.RangeIndex(n_payers, name='id_pagador'))
+    return medidas, dimensao
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo do ajuste e do score de pagadores em lote.')
+    parser.add_argument('--pagadores', type=int, nargs='+', default=[1_000_000, 5_000_000])
+    parser.add_argument('--alterados', type=float, default=0.01, help='Fração de pagadores tocados por uma carga incremental.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'pagadores':>12} {'features (s)':>13} {'ajuste (s)':>11} {'score (s)':>10} {'pagadores/s':>13} {'incremental (s)':>16}")
+    for n_payers in args.pagadores:
+        medidas, dimensao = synthetic_payers(n_payers, args.seed)
+        X = score_pagadores.feature_matrix(medidas, dimensao)
+        modelo = score_pagadores.fit_model(X, medidas['inadimplentes'], medidas['boletos'])
+
+        rng = np.random.default_rng(args.seed)
+        alterados = np.sort(rng.choice(n_payers, int(n_payers * args.alterados), replace=False))
+
+        t_features = best_time(lambda: score_pagadores.feature_matrix(medidas, dimensao))
+        t_ajuste = best_time(lambda: score_pagadores.fit_model(X, medidas['inadimplentes'], medidas['boletos']), repeticoes=1)
+        t_score = best_time(lambda: modelo.predict(X))
+        t_incremental = best_time(lambda: modelo.predict(score_pagadores.feature_matrix(medidas.iloc[alterados], dimensao)))
+        print(f"{n_payers:>12,} {t_features:>13.3f} {t_ajuste:>11.3f} {t_score:>10.3f} {n_payers / t_score:>13,.0f} {t_incremental:>16.4f}")
+
+
+if __name__ == '__main__':
+    main()
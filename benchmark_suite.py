@@ -0,0 +1,206 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import dados_sinteticos
+
+# --- Suíte de benchmarks em escala ---
+# Para cada tamanho, um processo filho mede ingestão, preparação, cache, as agregações de
+# analise_completa_final.py, cubo/índices e cada página do app renderizada sem navegador.
+# O filho recebe as bases sintéticas pelas variáveis de ambiente NUCLEA_*, então mede o mesmo
+# código que roda em produção. O resultado vai para um JSON comparável entre commits.
+
+BENCHMARK_DIR = 'benchmarks'
+# Aumento relativo de tempo a partir do qual --comparar aponta regressão
+REGRESSION_THRESHOLD = 0.10
+
+
+class StageRecorder:
+
+    def __init__(self):
+        self.records = []
+        tracemalloc.start()
+
+    def run(self, stage, func, *args, **kwargs):
+        # Tempo, pico de memória alocada na etapa (tracemalloc, inclui buffers NumPy) e pico de RSS do processo
+        tracemalloc.reset_peak()
+        antes, _ = tracemalloc.get_traced_memory()
+        inicio = time.perf_counter()
+        result = func(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        self.records.append({
+            'etapa': stage,
+            'segundos': round(segundos, 4),
+            'pico_mb': round((pico - antes) / 2**20, 1),
+            'rss_max_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1),
+        })
+        print(f"   {stage:<45} {segundos:>9.3f}s {self.records[-1]['pico_mb']:>10.1f} MB", file=sys.stderr)
+        return result
+
+
+def run_pages(recorder, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app_streamlit.py'), default_timeout=timeout)
+    recorder.run('app: primeira execução', app.run)
+    for page in app.sidebar.radio[0].options:
+        recorder.run(f'app: {page}', app.sidebar.radio[0].set_value(page).run)
+        if app.exception:
+            raise RuntimeError(f'Página {page} falhou: {app.exception}')
+
+
+def run_child(timeout):
+    # Importados aqui: os caminhos das bases vêm das variáveis de ambiente definidas pelo processo pai
+    import analise_completa_final
+    import cache_dados
+    import concentracao_exposicao
+    import correlacao_segmentos
+    import cubo_agregados
+    import indice_filtros
+    import motores_analise
+    import preparacao_dados
+
+    recorder = StageRecorder()
+    df_boletos, df_auxiliar = recorder.run('ingestão (read_csv)', preparacao_dados.read_sources)
+    data = recorder.run('preparação (prepare_data)', preparacao_dados.prepare_data, df_boletos, df_auxiliar)
+    del df_boletos, df_auxiliar
+    data.boletos = recorder.run('colunas derivadas', preparacao_dados.add_derived_columns, data.boletos)
+    data.boletos = recorder.run('tipos de armazenamento', cache_dados.to_storage_dtypes, data.boletos)
+    data.pagadores = cache_dados.to_storage_dtypes(data.pagadores)
+
+    data.versao = cache_dados.source_fingerprint()
+    path = cache_dados.cache_path(data.versao)
+    atual = {'base': data.versao, 'versao': data.versao, 'deltas': []}
+    recorder.run('cache: escrita', cache_dados.publish, data, atual)
+    del data
+    dados = recorder.run('cache: leitura (memory-map)', cache_dados.read_cache, path, cache_dados.current_version())
+    # Agregações no motor escolhido por NUCLEA_BACKEND (herdado do processo pai)
+    backend = recorder.run(f'análise: motor ({motores_analise.BACKEND})', motores_analise.get_backend, dados)
+    df_pagador_agg = recorder.run('análise: agregação por pagador', backend.payer_aggregate)
+    recorder.run('análise: status de pagamento', backend.status_distribution)
+    recorder.run('análise: correlações', backend.correlation, list(df_pagador_agg.columns.drop(['id_pagador', 'alto_risco'])))
+    recorder.run('análise: casos extremos', backend.extreme_cases)
+    recorder.run('análise: outliers (p99)', analise_completa_final.outlier_analysis, dados.boletos)
+    recorder.run('análise: inadimplência mensal', backend.monthly_default_rate)
+    recorder.run('análise: inadimplência por CNAE', backend.cnae_default_rate)
+    recorder.run('análise: inadimplência por espécie', backend.especie_default_rate)
+
+    recorder.run('cubo de agregados', cubo_agregados.build_cube, dados)
+    recorder.run('correlações por segmento', correlacao_segmentos.build_correlation_engine, dados)
+    recorder.run('concentração pagador × beneficiário', concentracao_exposicao.build_exposure, dados)
+    recorder.run('índices de filtro', indice_filtros.FilterIndex, dados.with_payer_columns(dados.boletos, cubo_agregados.PAYER_DIMS))
+    del df_pagador_agg, backend, dados
+
+    run_pages(recorder, timeout)
+    json.dump(recorder.records, sys.stdout)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'motor_analise': os.environ.get('NUCLEA_BACKEND', 'pandas'),
+    }
+
+
+def run_size(n_rows, data_dir, seed, timeout):
+    path_boletos, path_auxiliar = dados_sinteticos.synthetic_paths(n_rows, data_dir)
+    if not (os.path.exists(path_boletos) and os.path.exists(path_auxiliar)):
+        print(f"Gerando base sintética de {n_rows:,} boletos...", file=sys.stderr)
+        dados_sinteticos.generate(n_rows, data_dir, seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            NUCLEA_ARQUIVO_BOLETOS=path_boletos,
+            NUCLEA_ARQUIVO_AUXILIAR=path_auxiliar,
+            NUCLEA_CACHE_DIR=os.path.join(tmp, 'cache'),
+            NUCLEA_EXPORT_DIR=os.path.join(tmp, 'exportacao'),
+        )
+        print(f"\n{n_rows:,} boletos:", file=sys.stderr)
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--filho', '--timeout', str(timeout)],
+            env=env, stdout=subprocess.PIPE, text=True, check=True
+        )
+    return json.loads(saida.stdout)
+
+
+def compare(path_base, path_novo, threshold=REGRESSION_THRESHOLD):
+    with open(path_base) as f:
+        base = json.load(f)
+    with open(path_novo) as f:
+        novo = json.load(f)
+
+    regressoes = 0
+    print(f"Base: {base['commit']}  Novo: {novo['commit']}")
+    for n_rows, records in novo['resultados'].items():
+        anteriores = {record['etapa']: record for record in base['resultados'].get(n_rows, [])}
+        print(f"\n{int(n_rows):,} boletos:")
+        for record in records:
+            anterior = anteriores.get(record['etapa'])
+            if anterior is None or anterior['segundos'] == 0:
+                continue
+            razao = record['segundos'] / anterior['segundos']
+            regressao = razao > 1 + threshold
+            regressoes += regressao
+            print(f"   {record['etapa']:<45} {anterior['segundos']:>9.3f}s -> {record['segundos']:>9.3f}s "
+                  f"({razao:>5.2f}x){'  REGRESSÃO' if regressao else ''}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de tempo e memória em bases sintéticas de produção.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=dados_sinteticos.SYNTH_SIZES)
+    parser.add_argument('--dados', default=dados_sinteticos.SYNTH_DIR, help='Diretório das bases sintéticas (geradas se ausentes).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--saida', help=f'Arquivo JSON de resultado (padrão: {BENCHMARK_DIR}/benchmark_<commit>.json).')
+    parser.add_argument('--timeout', type=float, default=600, help='Tempo máximo por execução de página, em segundos.')
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'), help='Compara dois resultados e aponta regressões.')
+    parser.add_argument('--filho', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        run_child(args.timeout)
+        return
+    if args.comparar:
+        raise SystemExit(1 if compare(*args.comparar) else 0)
+
+    commit = git_commit()
+    resultado = {
+        'commit': commit,
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'ambiente': environment(),
+        'resultados': {str(n_rows): run_size(n_rows, args.dados, args.seed, args.timeout) for n_rows in args.linhas},
+    }
+
+    saida = args.saida or os.path.join(BENCHMARK_DIR, f'benchmark_{commit}.json')
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado salvo em {saida}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import pandas as pd
+
+import diagnostico
+import preparacao_dados
+from identificadores import ID_COLS, IdentifierDictionary
+from preparacao_dados import ARQUIVO_AUXILIAR, ARQUIVO_BOLETOS, Delta, PreparedData
+
+# Diretório do cache; em produção deve apontar para um volume persistente
+CACHE_DIR = os.environ.get('NUCLEA_CACHE_DIR', '.cache_dados')
+CACHE_PREFIX = 'preparado_'
+BOLETOS_FILE = 'boletos.arrow'
+PAGADORES_FILE = 'pagadores.arrow'
+# Versão corrente (base + cargas incrementais aplicadas) e metadados de cada carga incremental
+CURRENT_FILE = 'atual.json'
+DELTA_FILE = 'delta.json'
+REMOVIDOS_FILE = 'removidos.arrow'
+
+# Colunas de baixa cardinalidade guardadas como categorias
+CATEGORICAL_COLS = ['tipo_baixa', 'tipo_especie', 'status_pagamento', 'uf', 'cnae_4digitos', 'cnae_secao']
+
+HASH_BLOCK_SIZE = 1 << 20
+
+# Incrementar sempre que o esquema do dataset preparado mudar, para invalidar caches antigos
+CACHE_SCHEMA_VERSION = 3
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+
+
+@diagnostico.timed('cache: fingerprint das fontes')
+def source_fingerprint(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR):
+    fingerprints = {
+        'schema': CACHE_SCHEMA_VERSION,
+        'boletos': file_fingerprint(path_boletos),
+        'auxiliar': file_fingerprint(path_auxiliar),
+    }
+    payload = json.dumps(fingerprints, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def delta_version(parent, delta_fingerprint):
+    # Cada carga incremental gera uma nova versão, derivada da anterior e do conteúdo do delta
+    payload = json.dumps({'parent': parent, 'delta': delta_fingerprint['sha256']}, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def to_storage_dtypes(df):
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def cache_path(fingerprint, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'{CACHE_PREFIX}{fingerprint}')
+
+
+def read_arrow(path):
+    # Arrow IPC sem compressão: a leitura mapeia o arquivo em memória
+    return feather.read_table(path, memory_map=True)
+
+
+def write_arrow(table, path):
+    feather.write_feather(table, path, compression='uncompressed')
+
+
+class TableReader:
+    # Leitura projetada de uma tabela mapeada em memória: só as colunas pedidas são convertidas
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = table.schema.names
+
+    def __call__(self, columns):
+        return self.table.select(columns).to_pandas()
+
+
+@diagnostico.timed('cache: leitura')
+def read_cache(path, fingerprint):
+    # Os fatos não são convertidos aqui: cada consumidor lê só as colunas de que precisa
+    boletos = read_arrow(os.path.join(path, BOLETOS_FILE))
+    # Dimensão densa: a posição da linha é o código do pagador
+    pagadores = read_arrow(os.path.join(path, PAGADORES_FILE)).to_pandas().rename_axis('id_pagador')
+    identifiers = {
+        col: IdentifierDictionary.from_arrow(read_arrow(os.path.join(path, f'{col}.arrow')))
+        for col in ID_COLS
+    }
+    delta = None
+    if os.path.exists(os.path.join(path, DELTA_FILE)):
+        with open(os.path.join(path, DELTA_FILE)) as f:
+            meta = json.load(f)
+        removidos = read_arrow(os.path.join(path, REMOVIDOS_FILE)).to_pandas()
+        delta = Delta(meta['parent'], removidos, meta['n_novos'])
+    return PreparedData(None, pagadores, identifiers, fingerprint, delta, TableReader(boletos))
+
+
+@diagnostico.timed('cache: escrita')
+def write_cache(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # Fatos e dimensão de pagadores com os códigos inteiros; digests de 32 bytes em tabelas laterais
+    write_arrow(pa.Table.from_pandas(data.boletos, preserve_index=False), os.path.join(tmp_path, BOLETOS_FILE))
+    write_arrow(pa.Table.from_pandas(data.pagadores, preserve_index=False), os.path.join(tmp_path, PAGADORES_FILE))
+    for col, dictionary in data.identifiers.items():
+        write_arrow(dictionary.to_arrow(), os.path.join(tmp_path, f'{col}.arrow'))
+    if data.delta is not None:
+        write_arrow(pa.Table.from_pandas(data.delta.removidos, preserve_index=False), os.path.join(tmp_path, REMOVIDOS_FILE))
+        with open(os.path.join(tmp_path, DELTA_FILE), 'w') as f:
+            json.dump({'parent': data.delta.parent, 'n_novos': data.delta.n_novos}, f)
+
+    # Troca atômica para que leitores concorrentes nunca vejam um cache parcial
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Outro processo publicou o mesmo cache primeiro
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def remove_stale_caches(keep_path, cache_dir=CACHE_DIR):
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not name.startswith(CACHE_PREFIX) or path == keep_path:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def read_current(cache_dir=CACHE_DIR):
+    try:
+        with open(os.path.join(cache_dir, CURRENT_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def current_version(cache_dir=CACHE_DIR):
+    # Leitura barata, feita a cada rerun do dashboard para detectar novas cargas
+    atual = read_current(cache_dir)
+    return None if atual is None else atual['versao']
+
+
+def write_current(atual, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, CURRENT_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(atual, f, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def publish(data, atual, cache_dir=CACHE_DIR):
+    # Grava o cache da versão, aponta a versão corrente para ele e remove as anteriores
+    path = cache_path(data.versao, cache_dir)
+    if not os.path.exists(path):
+        write_cache(data, path)
+    write_current(atual, cache_dir)
+    remove_stale_caches(path, cache_dir)
+
+
+def read_delta_file(path_delta):
+    return pd.read_csv(path_delta, sep=',')
+
+
+def apply_delta_file(data, path_delta, path_auxiliar=ARQUIVO_AUXILIAR, fingerprint=None):
+    # Devolve a nova versão e o registro da carga para o arquivo de versão corrente
+    fingerprint = fingerprint or file_fingerprint(path_delta)
+    versao = delta_version(data.versao, fingerprint)
+    df_auxiliar = pd.read_csv(path_auxiliar, sep=',')
+    data = preparacao_dados.apply_delta(data, read_delta_file(path_delta), df_auxiliar, versao)
+    return data, {'path': os.path.abspath(path_delta), 'sha256': fingerprint['sha256']}
+
+
+def load_prepared_data(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR, cache_dir=CACHE_DIR):
+    fingerprint = source_fingerprint(path_boletos, path_auxiliar)
+    atual = read_current(cache_dir)
+    if atual is None or atual['base'] != fingerprint:
+        # Base nova (ou primeira carga): as cargas incrementais anteriores não se aplicam mais
+        atual = {'base': fingerprint, 'versao': fingerprint, 'deltas': []}
+
+    path = cache_path(atual['versao'], cache_dir)
+    if os.path.exists(path):
+        if read_current(cache_dir) != atual:
+            # Cache anterior ao registro de versão corrente
+            write_current(atual, cache_dir)
+        return read_cache(path, atual['versao'])
+
+    data = preparacao_dados.load_and_prepare_data(path_boletos, path_auxiliar)
+    data.boletos = to_storage_dtypes(data.boletos)
+    data.pagadores = to_storage_dtypes(data.pagadores)
+    data.versao = fingerprint
+
+    # Cache ausente: reaplica as cargas incrementais registradas, na ordem
+    for registro in atual['deltas']:
+        delta_fingerprint = file_fingerprint(registro['path'])
+        if delta_fingerprint['sha256'] != registro['sha256']:
+            raise ValueError(f"Arquivo de carga incremental alterado: {registro['path']}")
+        data, _ = apply_delta_file(data, registro['path'], path_auxiliar, delta_fingerprint)
+
+    publish(data, atual, cache_dir)
+    return data
@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# --- Concentração e exposição pagador × beneficiário ---
+# Cada boleto liga um pagador (sacado) a um beneficiário (cedente). Os valores são somados numa
+# matriz esparsa pagador × beneficiário (CSR, só os pares que existem): valor nominal e valor em
+# aberto (boletos inadimplentes). Numa carteira de FIDC a concentração importa tanto quanto a
+# inadimplência de cada pagador:
+# - HHI (soma dos quadrados das participações, 0–1) e participação dos N maiores, por beneficiário
+#   (nos seus pagadores) e por pagador (nos seus beneficiários);
+# - exposição de cada beneficiário a pagadores com algum boleto em aberto, em qualquer beneficiário.
+# Tudo sai de somas por linha da matriz (bincount sobre indptr) e de produtos matriz × vetor: custo
+# proporcional ao número de pares, sem tabela densa nem groupby por par.
+
+FACT_COLS = ['id_pagador', 'id_beneficiario', 'vlr_nominal', 'inadimplente']
+
+AXES = {'beneficiario': 'Beneficiário', 'pagador': 'Pagador'}
+MEASURES = {'nominal': 'Valor nominal', 'aberto': 'Valor em aberto'}
+TOP_N = 5
+
+
+class ExposureMatrix:
+
+    def __init__(self, nominal, aberto):
+        # nominal, aberto: csr_array (pagadores, beneficiários) em formato canônico
+        self.matrizes = {
+            ('pagador', 'nominal'): nominal,
+            ('pagador', 'aberto'): aberto,
+            ('beneficiario', 'nominal'): nominal.T.tocsr(),
+            ('beneficiario', 'aberto'): aberto.T.tocsr(),
+        }
+        self._lock = threading.Lock()
+        self._ordenadas = {}
+
+    @property
+    def n_pairs(self):
+        return self.matrizes[('pagador', 'nominal')].nnz
+
+    def _ranked(self, por, medida):
+        # Por linha (entidade de `por`): participação de cada contraparte e sua posição, da maior
+        # para a menor. Ordenação feita uma vez; qualquer N depois é só uma soma filtrada.
+        with self._lock:
+            chave = (por, medida)
+            if chave not in self._ordenadas:
+                matriz = self.matrizes[chave]
+                linhas = np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+                total = np.bincount(linhas, weights=matriz.data, minlength=matriz.shape[0])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    share = matriz.data / total[linhas]
+                ordem = np.lexsort((-matriz.data, linhas))
+                posicao = np.empty(matriz.nnz, dtype=np.int64)
+                posicao[ordem] = np.arange(matriz.nnz) - matriz.indptr[linhas[ordem]]
+                self._ordenadas[chave] = (linhas, total, share, posicao)
+            return self._ordenadas[chave]
+
+    def concentration(self, por='beneficiario', medida='nominal', top=TOP_N):
+        # Uma linha por entidade com valor > 0 (índice = código do pagador ou do beneficiário)
+        linhas, total, share, posicao = self._ranked(por, medida)
+        n = len(total)
+        no_top = posicao < top
+        tabela = pd.DataFrame({
+            'valor': total,
+            'contrapartes': np.bincount(linhas, minlength=n),
+            'hhi': np.bincount(linhas, weights=share ** 2, minlength=n),
+            'share_maior': np.bincount(linhas[posicao == 0], weights=share[posicao == 0], minlength=n),
+            f'share_top_{top}': np.bincount(linhas[no_top], weights=share[no_top], minlength=n),
+        }, index=pd.RangeIndex(n, name=f'id_{por}'))
+        tabela = tabela[tabela['valor'] > 0]
+        # Número equivalente de contrapartes de mesmo tamanho
+        tabela['contrapartes_equivalentes'] = 1 / tabela['hhi']
+        return tabela
+
+    def portfolio_hhi(self, por='beneficiario', medida='nominal'):
+        # Concentração da carteira inteira entre as entidades de `por`
+        total = self._ranked(por, medida)[1]
+        share = total / total.sum()
+        return float((share ** 2).sum())
+
+    def open_payer_exposure(self):
+        # Por beneficiário: valor com pagadores que têm boleto em aberto em qualquer beneficiário
+        nominal = self.matrizes[('beneficiario', 'nominal')]
+        aberto = self.matrizes[('beneficiario', 'aberto')]
+        pagador_em_aberto = (self.matrizes[('pagador', 'aberto')].sum(axis=1) > 0).astype('float64')
+        presenca = nominal.copy()
+        presenca.data = np.ones_like(presenca.data)
+
+        tabela = pd.DataFrame({
+            'vlr_nominal': nominal.sum(axis=1),
+            'vlr_em_aberto': aberto.sum(axis=1),
+            'pagadores': presenca.sum(axis=1),
+            'pagadores_em_aberto': presenca @ pagador_em_aberto,
+            'exposicao_pagadores_em_aberto': nominal @ pagador_em_aberto,
+        }, index=pd.RangeIndex(nominal.shape[0], name='id_beneficiario'))
+        tabela = tabela[tabela['pagadores'] > 0].astype({'pagadores': 'int64', 'pagadores_em_aberto': 'int64'})
+        tabela['share_exposicao'] = tabela['exposicao_pagadores_em_aberto'] / tabela['vlr_nominal']
+        return tabela
+
+
+def build_exposure(dados):
+    df = dados.fact_columns(FACT_COLS)
+    # Boletos com pagador ou beneficiário malformado (código -1) não formam um par
+    df = df[(df['id_pagador'].to_numpy() >= 0) & (df['id_beneficiario'].to_numpy() >= 0)]
+    pagadores = df['id_pagador'].to_numpy()
+    beneficiarios = df['id_beneficiario'].to_numpy()
+    valor = df['vlr_nominal'].to_numpy(dtype='float64', na_value=0.0)
+    em_aberto = df['inadimplente'].to_numpy().astype(bool)
+    shape = (len(dados.pagadores), len(dados.identifiers['id_beneficiario']))
+
+    def _matrix(mascara):
+        # Pares repetidos (vários boletos) são somados na conversão para CSR
+        matriz = sparse.coo_array((valor[mascara], (pagadores[mascara], beneficiarios[mascara])), shape=shape).tocsr()
+        matriz.eliminate_zeros()
+        return matriz
+
+    return ExposureMatrix(_matrix(slice(None)), _matrix(em_aberto))
@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from preparacao_dados import PAYER_INDICATORS, payer_rows
+
+# --- Correlações por segmento sobre estatísticas suficientes ---
+# As correlações dos indicadores com a taxa de inadimplência são feitas sobre a tabela por pagador.
+# Para cada dimensão de segmento guardamos, por valor do segmento, contagens, somas, somas de
+# quadrados e produtos cruzados de cada par de variáveis, só nas linhas em que as duas variáveis
+# existem (pares completos, como DataFrame.corr). A matriz de um segmento, ou de uma união de
+# segmentos, é a soma dessas estatísticas: O(k²) por segmento, sem reagrupar os boletos.
+# UF e CNAE são atributos do pagador (uma linha por pagador); mês de emissão e espécie são
+# atributos do boleto, então a linha é (pagador, segmento), com a taxa calculada nesses boletos.
+# Uma carga incremental atualiza só as linhas (pagador, segmento) tocadas: subtrai a contribuição
+# antiga e soma a nova.
+
+SEGMENT_DIMS = {'uf': 'UF', 'cnae_4digitos': 'CNAE (4 dígitos)', 'mes_emissao': 'Mês de Emissão', 'tipo_especie': 'Tipo de Espécie'}
+PAYER_DIMS = ['uf', 'cnae_4digitos']
+FACT_COLS = ['id_pagador', 'mes_emissao', 'tipo_especie', 'inadimplente']
+VARIABLES = ['taxa_inadimplencia'] + list(PAYER_INDICATORS)
+VARIANCE_TOLERANCE = 1e-10
+
+
+@dataclass
+class SegmentStats:
+    # chaves: valores do segmento (inclui nulo); demais: arrays (segmentos, k, k), em que
+    # [s, a, b] considera só as linhas do segmento s com a e b preenchidos
+    chaves: pd.Index
+    n: np.ndarray
+    soma: np.ndarray
+    soma_quadrados: np.ndarray
+    produtos: np.ndarray
+    # boletos e inadimplentes por (pagador, segmento), para refazer as linhas numa carga incremental
+    medidas: pd.DataFrame
+
+    def total(self, values=None):
+        # Estatísticas somadas dos segmentos em `values` (None = todos)
+        if values is None:
+            selecionados = slice(None)
+        else:
+            selecionados = self.chaves.get_indexer(pd.Index(values))
+            selecionados = selecionados[selecionados >= 0]
+        return tuple(arr[selecionados].sum(axis=0) for arr in (self.n, self.soma, self.soma_quadrados, self.produtos))
+
+
+class CorrelationEngine:
+
+    def __init__(self, segmentos, deslocamento):
+        # deslocamento: média global de cada variável, subtraída antes de acumular (estabilidade numérica)
+        self.segmentos = segmentos
+        self.deslocamento = deslocamento
+
+    def correlation(self, cols=VARIABLES, dim='uf', values=None):
+        # Matriz de correlação de Pearson por pares completos na união dos segmentos `values`
+        n, soma, soma_quadrados, produtos = self.segmentos[dim].total(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = produtos - soma * soma.T / n
+            var = soma_quadrados - soma ** 2 / n
+            # Variância nula (dentro do erro de arredondamento das somas) não tem correlação, como no pandas
+            var = np.where(var > VARIANCE_TOLERANCE * soma_quadrados, var, np.nan)
+            corr = cov / np.sqrt(var * var.T)
+        corr[n < 2] = np.nan
+        diagonal = np.isfinite(np.diag(corr))
+        corr[np.diag_indices_from(corr)] = np.where(diagonal, 1.0, np.nan)
+        corr = np.clip(corr, -1, 1)
+        posicoes = [VARIABLES.index(col) for col in cols]
+        return pd.DataFrame(corr[np.ix_(posicoes, posicoes)], index=cols, columns=cols)
+
+    def support(self, dim='uf', values=None):
+        # Número de linhas (pagadores ou pares pagador × segmento) na seleção
+        return int(self.segmentos[dim].total(values)[0][0, 0])
+
+    def values(self, dim):
+        # Valores de segmento com ao menos uma linha (sem o nulo)
+        return sorted(self.segmentos[dim].medidas.index.get_level_values(dim).dropna().unique())
+
+    def apply_delta(self, removidos, novos, dimensao):
+        # Engine da versão seguinte; o atual não é alterado (outras sessões o usam).
+        # `removidos` e `novos` já trazem as colunas de PAYER_DIMS.
+        segmentos = {}
+        for dim, stats in self.segmentos.items():
+            alterados = pd.concat([_measures(removidos, dim), _measures(novos, dim)]).index.unique()
+            anteriores = stats.medidas.loc[stats.medidas.index.intersection(alterados)]
+            medidas = stats.medidas[['boletos', 'inadimplentes']].add(_measures(novos, dim), fill_value=0)
+            medidas = medidas.sub(_measures(removidos, dim), fill_value=0)
+            medidas = medidas[medidas['boletos'] > 0].astype('int64')
+            atuais = medidas.loc[medidas.index.intersection(alterados)]
+
+            chaves = stats.chaves.append(pd.Index(atuais.index.get_level_values(dim)).unique().difference(stats.chaves))
+            arrays = [np.zeros((len(chaves),) + arr.shape[1:]) for arr in (stats.n, stats.soma, stats.soma_quadrados, stats.produtos)]
+            for novo, antigo in zip(arrays, (stats.n, stats.soma, stats.soma_quadrados, stats.produtos)):
+                novo[:len(stats.chaves)] = antigo
+            _accumulate(arrays, chaves, anteriores, dim, dimensao, self.deslocamento, -1)
+            _accumulate(arrays, chaves, atuais, dim, dimensao, self.deslocamento, 1)
+            segmentos[dim] = SegmentStats(chaves, *arrays, medidas)
+        return CorrelationEngine(segmentos, self.deslocamento)
+
+
+def _measures(df, dim):
+    return df.groupby(['id_pagador', dim], observed=True, dropna=False)['inadimplente'].agg(boletos='size', inadimplentes='sum')
+
+
+def _matrix(medidas, dimensao):
+    # Uma linha por (pagador, segmento): taxa de inadimplência e indicadores do pagador
+    codes = medidas.index.get_level_values('id_pagador').to_numpy()
+    indicadores = payer_rows(dimensao[list(PAYER_INDICATORS.values())], codes).to_numpy(dtype='float64')
+    taxa = (medidas['inadimplentes'] / medidas['boletos']).to_numpy(dtype='float64')
+    return np.column_stack([taxa, indicadores])
+
+
+def _accumulate(arrays, chaves, medidas, dim, dimensao, deslocamento, sinal):
+    if not len(medidas):
+        return
+    n, soma, soma_quadrados, produtos = arrays
+    valores = _matrix(medidas, dimensao) - deslocamento
+    preenchido = ~np.isnan(valores)
+    valores = np.where(preenchido, valores, 0.0)
+    mascara = preenchido.astype('float64')
+
+    segmento = chaves.get_indexer(medidas.index.get_level_values(dim))
+    ordem = np.argsort(segmento, kind='stable')
+    segmento, valores, mascara = segmento[ordem], valores[ordem], mascara[ordem]
+    inicios = np.flatnonzero(np.r_[True, segmento[1:] != segmento[:-1]])
+    for inicio, fim in zip(inicios, np.r_[inicios[1:], len(segmento)]):
+        s = segmento[inicio]
+        x, m = valores[inicio:fim], mascara[inicio:fim]
+        n[s] += sinal * (m.T @ m)
+        soma[s] += sinal * (x.T @ m)
+        soma_quadrados[s] += sinal * ((x * x).T @ m)
+        produtos[s] += sinal * (x.T @ x)
+
+
+def _segment_stats(medidas, dim, dimensao, deslocamento):
+    chaves = pd.Index(medidas.index.get_level_values(dim).unique())
+    k = len(VARIABLES)
+    arrays = [np.zeros((len(chaves), k, k)) for _ in range(4)]
+    _accumulate(arrays, chaves, medidas, dim, dimensao, deslocamento, 1)
+    return SegmentStats(chaves, *arrays, medidas)
+
+
+def build_correlation_engine(dados):
+    df = dados.with_payer_columns(dados.fact_columns(FACT_COLS), PAYER_DIMS)
+    por_pagador = df.groupby('id_pagador')['inadimplente'].agg(boletos='size', inadimplentes='sum')
+    deslocamento = np.nanmean(_matrix(por_pagador, dados.pagadores), axis=0)
+    segmentos = {dim: _segment_stats(_measures(df, dim), dim, dados.pagadores, deslocamento) for dim in SEGMENT_DIMS}
+    return CorrelationEngine(segmentos, deslocamento)
+
+
+def engine_for(dados, anterior=None):
+    # Reaproveita as estatísticas da versão anterior quando a versão atual é uma carga incremental sobre ela
+    delta = dados.delta
+    if anterior is not None and delta is not None and anterior[0] == delta.parent:
+        removidos = dados.with_payer_columns(delta.removidos, PAYER_DIMS)
+        novos = dados.with_payer_columns(delta.novos(dados.fact_columns(FACT_COLS)), PAYER_DIMS)
+        return anterior[1].apply_delta(removidos, novos, dados.pagadores)
+    return build_correlation_engine(dados)
@@ -0,0 +1,152 @@
+import copy
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from preparacao_dados import PAYER_INDICATORS
+from sketch_quantis import QuantileSketch, sketch_of, sketches_by
+
+# Dimensões e medidas do cubo de agregados
+CUBE_DIMS = ['mes_emissao', 'tipo_especie', 'cnae_4digitos', 'uf', 'status_pagamento']
+# Dimensões que são atributos do pagador, buscadas na dimensão de pagadores
+PAYER_DIMS = ['cnae_4digitos', 'uf']
+# Colunas dos fatos lidas para montar o cubo
+FACT_COLS = ['id_pagador', 'mes_emissao', 'tipo_especie', 'status_pagamento', 'vlr_nominal', 'vlr_baixa', 'inadimplente']
+CUBE_MEASURES = ['boletos', 'vlr_nominal', 'vlr_baixa', 'inadimplentes']
+PAYER_MEASURES = ['boletos', 'vlr_nominal', 'inadimplentes']
+
+
+@dataclass
+class AggregateCube:
+    # segmentos: uma linha por combinação das dimensões de CUBE_DIMS
+    # pagadores: uma linha por pagador (a dimensão de maior cardinalidade fica separada)
+    segmentos: pd.DataFrame
+    pagadores: pd.DataFrame
+    # Sketch de quantis do vlr_nominal no total e por valor de cada dimensão do cubo
+    valores: QuantileSketch
+    valores_por: dict
+
+    def totals(self):
+        return self.segmentos[CUBE_MEASURES].sum()
+
+    def default_rate_total(self):
+        totals = self.totals()
+        return totals['inadimplentes'] / totals['boletos'] * 100
+
+    def rollup(self, dims):
+        # Segmentos com dimensão nula ficam de fora, como no groupby sobre os boletos
+        return self.segmentos.groupby(dims, observed=True)[CUBE_MEASURES].sum()
+
+    def status_distribution(self):
+        counts = self.rollup('status_pagamento')['boletos']
+        return (counts / counts.sum() * 100).sort_values(ascending=False)
+
+    def default_rate_by(self, dim, min_boletos=0):
+        counts = self.rollup(dim)
+        counts = counts[counts['boletos'] >= min_boletos]
+        return counts['inadimplentes'] / counts['boletos'] * 100
+
+    def value_quantile(self, q, dim=None, values=None):
+        # Quantil aproximado do vlr_nominal; com `dim`, restrito aos segmentos em `values`
+        if dim is None:
+            return self.valores.quantile(q)
+        sketches = self.valores_por[dim]
+        selected = sketches if values is None else {value: sketches[value] for value in values if value in sketches}
+        if not selected:
+            return np.nan
+        merged = QuantileSketch(self.valores.relative_accuracy)
+        for sketch in selected.values():
+            merged.merge(sketch)
+        return merged.quantile(q)
+
+    def value_quantiles_by(self, dim, q):
+        # Um quantil por segmento da dimensão, na ordem dos segmentos
+        return pd.Series({value: sketch.quantile(q) for value, sketch in self.valores_por[dim].items()}, name=f'p{q * 100:g}')
+
+    def payer_aggregate(self, indicators):
+        columns = ['taxa_inadimplencia'] + list(indicators)
+        return self.pagadores[columns].reset_index()
+
+    def apply_delta(self, removidos, novos, dimensao):
+        # Cubo da versão seguinte a partir do atual: as medidas são somas, então basta subtrair
+        # as linhas substituídas e somar as novas. O cubo atual não é alterado (outras sessões o usam).
+        # `removidos` e `novos` já trazem as colunas de PAYER_DIMS.
+        partes = [self.segmentos, _segment_measures(novos)]
+        if len(removidos):
+            negativos = _segment_measures(removidos)
+            negativos[CUBE_MEASURES] *= -1
+            partes.append(negativos)
+        segmentos = pd.concat(partes, ignore_index=True)
+        for dim in CUBE_DIMS:
+            if isinstance(novos[dim].dtype, pd.CategoricalDtype):
+                segmentos[dim] = segmentos[dim].astype(novos[dim].dtype)
+        segmentos = segmentos.groupby(CUBE_DIMS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+        segmentos = segmentos[segmentos['boletos'] > 0].reset_index(drop=True)
+
+        medidas = self.pagadores[PAYER_MEASURES].add(_payer_measures(novos), fill_value=0)
+        medidas = medidas.sub(_payer_measures(removidos), fill_value=0)
+        medidas = medidas[medidas['boletos'] > 0].astype({'boletos': 'int64', 'inadimplentes': 'int64'})
+        pagadores = _payer_aggregate(medidas.sort_index(), dimensao)
+
+        valores = copy.deepcopy(self.valores)
+        valores.update(novos['vlr_nominal']).remove(removidos['vlr_nominal'])
+        valores_por = copy.deepcopy(self.valores_por)
+        for dim, sketches in valores_por.items():
+            for value, group in novos.groupby(dim, observed=True)['vlr_nominal']:
+                sketches.setdefault(value, QuantileSketch(valores.relative_accuracy)).update(group)
+            for value, group in removidos.groupby(dim, observed=True)['vlr_nominal']:
+                if sketches[value].remove(group).count == 0:
+                    del sketches[value]
+
+        return AggregateCube(segmentos, pagadores, valores, valores_por)
+
+
+def _segment_measures(df):
+    return df.groupby(CUBE_DIMS, observed=True, dropna=False).agg(
+        boletos=('inadimplente', 'size'),
+        vlr_nominal=('vlr_nominal', 'sum'),
+        vlr_baixa=('vlr_baixa', 'sum'),
+        inadimplentes=('inadimplente', 'sum'),
+    ).reset_index()
+
+
+def _payer_measures(df):
+    return df.groupby('id_pagador').agg(
+        boletos=('inadimplente', 'size'),
+        vlr_nominal=('vlr_nominal', 'sum'),
+        inadimplentes=('inadimplente', 'sum'),
+    )
+
+
+def _payer_indicators(dimensao):
+    # Os indicadores são atributos do pagador: vêm direto da dimensão, sem passar pelos boletos
+    indicadores = dimensao[list(PAYER_INDICATORS.values())].astype('float64')
+    return indicadores.set_axis(list(PAYER_INDICATORS), axis=1)
+
+
+def _payer_aggregate(medidas, dimensao):
+    pagadores = medidas.join(_payer_indicators(dimensao))
+    pagadores.insert(0, 'taxa_inadimplencia', pagadores['inadimplentes'] / pagadores['boletos'])
+    return pagadores
+
+
+def build_cube(dados):
+    df = dados.with_payer_columns(dados.fact_columns(FACT_COLS), PAYER_DIMS)
+    segmentos = _segment_measures(df)
+    pagadores = _payer_aggregate(_payer_measures(df), dados.pagadores)
+
+    valores = sketch_of(df['vlr_nominal'])
+    valores_por = {dim: sketches_by(df['vlr_nominal'], df[dim]) for dim in CUBE_DIMS}
+
+    return AggregateCube(segmentos, pagadores, valores, valores_por)
+
+
+def cube_for(dados, anterior=None):
+    # Reaproveita o cubo da versão anterior quando a versão atual é uma carga incremental sobre ela
+    delta = dados.delta
+    if anterior is not None and delta is not None and anterior[0] == delta.parent:
+        removidos = dados.with_payer_columns(delta.removidos, PAYER_DIMS)
+        novos = dados.with_payer_columns(delta.novos(dados.fact_columns(FACT_COLS)), PAYER_DIMS)
+        return anterior[1].apply_delta(removidos, novos, dados.pagadores)
+    return build_cube(dados)
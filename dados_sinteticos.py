@@ -0,0 +1,195 @@
+import argparse
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from identificadores import DIGEST_SIZE, digests_to_hex
+from preparacao_dados import ARQUIVO_AUXILIAR, ARQUIVO_BOLETOS, read_sources
+
+# --- Gerador de bases sintéticas em escala de produção ---
+# As distribuições vêm das bases reais do repositório (frequências das categorias, valores e
+# prazos empíricos, taxas de nulos, proporção de pagadores e beneficiários por boleto). As linhas
+# são geradas e gravadas em blocos, então a memória não cresce com o tamanho da base.
+
+SYNTH_DIR = os.environ.get('NUCLEA_DADOS_SINTETICOS', 'dados_sinteticos')
+SYNTH_SIZES = [1_000_000, 10_000_000, 50_000_000]
+CHUNK_ROWS = 1_000_000
+
+# Janela de vencimentos da base sintética (a amostra real cobre só maio/2024)
+VENCIMENTO_INICIO = '2023-06-01'
+VENCIMENTO_FIM = '2024-05-31'
+
+# Dispersão do número de boletos por pagador/beneficiário (pesos lognormais: a maioria tem um
+# único boleto e poucos concentram centenas, como na amostra real)
+CONCENTRACAO = 2.0
+# Ruído relativo aplicado aos valores reamostrados
+RUIDO_VALORES = 0.05
+
+
+@dataclass
+class SourceProfile:
+    # Identificadores distintos por boleto
+    pagadores_por_boleto: float
+    beneficiarios_por_boleto: float
+    # Fração dos pagadores com cadastro na base auxiliar e cadastros sem boletos (por boleto)
+    cobertura_auxiliar: float
+    cadastros_sem_boleto: float
+    tipo_baixa: pd.Series
+    tipo_especie: pd.Series
+    # Probabilidade de vlr_baixa nulo por tipo de baixa
+    vlr_baixa_nulo: pd.Series
+    vlr_nominal: np.ndarray
+    razao_baixa: np.ndarray
+    prazo_dias: np.ndarray
+    atraso_dias: np.ndarray
+    # Base auxiliar: valores não nulos e taxa de nulos de cada coluna
+    auxiliar: dict
+    auxiliar_nulos: pd.Series
+    uf: pd.Series
+
+
+def profile_sources(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR):
+    df_boletos, df_auxiliar = read_sources(path_boletos, path_auxiliar)
+    emissao, vencimento, pagamento = (pd.to_datetime(df_boletos[col]) for col in ['dt_emissao', 'dt_vencimento', 'dt_pagamento'])
+    tipo_baixa = df_boletos['tipo_baixa'].fillna('')
+    aux_cols = [col for col in df_auxiliar.columns if col not in ('id_cnpj', 'uf')]
+
+    return SourceProfile(
+        pagadores_por_boleto=df_boletos['id_pagador'].nunique() / len(df_boletos),
+        beneficiarios_por_boleto=df_boletos['id_beneficiario'].nunique() / len(df_boletos),
+        cobertura_auxiliar=df_boletos['id_pagador'].drop_duplicates().isin(df_auxiliar['id_cnpj']).mean(),
+        cadastros_sem_boleto=(~df_auxiliar['id_cnpj'].isin(df_boletos['id_pagador'])).sum() / len(df_boletos),
+        tipo_baixa=tipo_baixa.value_counts(normalize=True),
+        tipo_especie=df_boletos['tipo_especie'].value_counts(normalize=True),
+        vlr_baixa_nulo=df_boletos['vlr_baixa'].isna().groupby(tipo_baixa).mean(),
+        vlr_nominal=df_boletos['vlr_nominal'].to_numpy(),
+        razao_baixa=(df_boletos['vlr_baixa'] / df_boletos['vlr_nominal']).dropna().to_numpy(),
+        prazo_dias=(vencimento - emissao).dt.days.to_numpy(),
+        atraso_dias=(pagamento - vencimento).dt.days.dropna().to_numpy(),
+        auxiliar={col: df_auxiliar[col].dropna().to_numpy() for col in aux_cols},
+        auxiliar_nulos=df_auxiliar[aux_cols + ['uf']].isna().mean(),
+        uf=df_auxiliar['uf'].value_counts(normalize=True),
+    )
+
+
+def random_ids(rng, n):
+    # Identificadores no mesmo formato das bases (SHA-256 em hexadecimal)
+    return np.frombuffer(rng.bytes(n * DIGEST_SIZE), dtype=f'S{DIGEST_SIZE}')
+
+
+def choice(rng, frequencies, size):
+    return rng.choice(frequencies.index.to_numpy(), size=size, p=frequencies.to_numpy() / frequencies.sum())
+
+
+def with_nulls(rng, values, null_rate):
+    values = pd.Series(values)
+    return values.mask(rng.random(len(values)) < null_rate)
+
+
+def id_sampler(rng, n_ids, n_rows):
+    # Cada identificador aparece ao menos uma vez (uma faixa de códigos por bloco); os boletos
+    # restantes são sorteados com pesos lognormais
+    cumulative = np.cumsum(rng.lognormal(0, CONCENTRACAO, n_ids))
+
+    def sample(start, stop):
+        first = np.arange(n_ids * start // n_rows, n_ids * stop // n_rows)
+        rest = np.searchsorted(cumulative, rng.random(stop - start - len(first)) * cumulative[-1])
+        return rng.permutation(np.concatenate([first, rest]))
+    return sample
+
+
+def generate_auxiliar(profile, pagadores, n_rows, rng):
+    # Cadastro para parte dos pagadores com boletos e para pagadores sem boletos;
+    # linhas sem cadastro completo têm todos os indicadores nulos
+    sem_boleto = random_ids(rng, round(n_rows * profile.cadastros_sem_boleto))
+    cadastrados = np.concatenate([pagadores[rng.random(len(pagadores)) < profile.cobertura_auxiliar], sem_boleto])
+    cadastrados = cadastrados[rng.permutation(len(cadastrados))]
+    n = len(cadastrados)
+    sem_cadastro = rng.random(n) < profile.auxiliar_nulos.min()
+
+    df = pd.DataFrame({'id_cnpj': digests_to_hex(cadastrados)})
+    for col, values in profile.auxiliar.items():
+        # Nulos além dos cadastros vazios, para reproduzir a taxa da coluna
+        extra = max(profile.auxiliar_nulos[col] - profile.auxiliar_nulos.min(), 0) / (1 - profile.auxiliar_nulos.min())
+        df[col] = with_nulls(rng, rng.choice(values, n), extra).mask(sem_cadastro).to_numpy()
+        if col == 'cd_cnae_prin':
+            df['uf'] = pd.Series(choice(rng, profile.uf, n)).mask(sem_cadastro).to_numpy()
+    return df
+
+
+def generate_boletos_chunk(profile, pagadores, beneficiarios, sample_pagador, sample_beneficiario, start, stop, rng, vencimentos):
+    n = stop - start
+    tipo_baixa = choice(rng, profile.tipo_baixa, n)
+    em_aberto = tipo_baixa == ''
+
+    vencimento = vencimentos[rng.integers(0, len(vencimentos), n)]
+    emissao = vencimento - rng.choice(profile.prazo_dias, n).astype('timedelta64[D]')
+    pagamento = vencimento + rng.choice(profile.atraso_dias, n).astype('timedelta64[D]')
+
+    vlr_nominal = np.round(rng.choice(profile.vlr_nominal, n) * rng.lognormal(0, RUIDO_VALORES, n), 2)
+    vlr_baixa = np.round(vlr_nominal * rng.choice(profile.razao_baixa, n), 2)
+    baixa_nula = rng.random(n) < pd.Series(tipo_baixa).map(profile.vlr_baixa_nulo).fillna(0).to_numpy()
+
+    return pd.DataFrame({
+        'id_boleto': digests_to_hex(random_ids(rng, n)),
+        'id_pagador': digests_to_hex(pagadores[sample_pagador(start, stop)]),
+        'id_beneficiario': digests_to_hex(beneficiarios[sample_beneficiario(start, stop)]),
+        'dt_emissao': pd.DatetimeIndex(emissao).strftime('%Y-%m-%d'),
+        'dt_vencimento': pd.DatetimeIndex(vencimento).strftime('%Y-%m-%d'),
+        'dt_pagamento': pd.Series(pd.DatetimeIndex(pagamento).strftime('%Y-%m-%d')).mask(em_aberto),
+        'vlr_nominal': vlr_nominal,
+        'vlr_baixa': pd.Series(vlr_baixa).mask(baixa_nula),
+        'tipo_baixa': pd.Series(tipo_baixa).mask(em_aberto),
+        'tipo_especie': choice(rng, profile.tipo_especie, n),
+    })
+
+
+def synthetic_paths(n_rows, output_dir=SYNTH_DIR):
+    return (
+        os.path.join(output_dir, f'boletos_{n_rows}.csv'),
+        os.path.join(output_dir, f'auxiliar_{n_rows}.csv'),
+    )
+
+
+def generate(n_rows, output_dir=SYNTH_DIR, seed=42, profile=None, chunk_rows=CHUNK_ROWS):
+    profile = profile or profile_sources()
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    path_boletos, path_auxiliar = synthetic_paths(n_rows, output_dir)
+
+    pagadores = random_ids(rng, max(1, round(n_rows * profile.pagadores_por_boleto)))
+    beneficiarios = random_ids(rng, max(1, round(n_rows * profile.beneficiarios_por_boleto)))
+    generate_auxiliar(profile, pagadores, n_rows, rng).to_csv(path_auxiliar, index=False)
+
+    sample_pagador = id_sampler(rng, len(pagadores), n_rows)
+    sample_beneficiario = id_sampler(rng, len(beneficiarios), n_rows)
+    vencimentos = np.arange(np.datetime64(VENCIMENTO_INICIO), np.datetime64(VENCIMENTO_FIM) + 1)
+
+    tmp_path = f'{path_boletos}.tmp'
+    for start in range(0, n_rows, chunk_rows):
+        chunk = generate_boletos_chunk(
+            profile, pagadores, beneficiarios, sample_pagador, sample_beneficiario,
+            start, min(start + chunk_rows, n_rows), rng, vencimentos
+        )
+        chunk.to_csv(tmp_path, index=False, header=start == 0, mode='w' if start == 0 else 'a')
+    os.replace(tmp_path, path_boletos)
+    return path_boletos, path_auxiliar
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera bases sintéticas de boletos e auxiliar a partir do perfil das bases reais.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=SYNTH_SIZES)
+    parser.add_argument('--saida', default=SYNTH_DIR)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    profile = profile_sources()
+    for n_rows in args.linhas:
+        path_boletos, path_auxiliar = generate(n_rows, args.saida, args.seed, profile)
+        print(f"{n_rows:,} boletos: {path_boletos}, {path_auxiliar}")
+
+
+if __name__ == '__main__':
+    main()
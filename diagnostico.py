@@ -0,0 +1,151 @@
+import datetime
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# --- Instrumentação por etapa ---
+# Cada etapa registra tempo de parede, memória e linhas processadas num buffer circular
+# compartilhado pelo processo (o app mostra os registros no painel de diagnóstico).
+# Por padrão só a RSS é lida (custo desprezível); com NUCLEA_DIAGNOSTICO_MEMORIA=1 o tracemalloc
+# mede também o pico alocado em cada etapa. Com NUCLEA_DIAGNOSTICO_ARQUIVO, cada registro é
+# acrescentado a esse arquivo JSON Lines.
+
+MAX_RECORDS = 2000
+TRACE_MEMORY = os.environ.get('NUCLEA_DIAGNOSTICO_MEMORIA') == '1'
+JSONL_PATH = os.environ.get('NUCLEA_DIAGNOSTICO_ARQUIVO')
+
+_records = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_local = threading.local()
+
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+def best_time(func, repeticoes=3):
+    # Menor tempo de parede entre as repetições (usado pelos scripts de benchmark)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        # Sem /proc: pico de RSS do processo
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+        if JSONL_PATH:
+            with open(JSONL_PATH, 'a') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+@contextmanager
+def stage(name, rows=None, **extra):
+    # Uso: `with stage('merge', rows=len(df)) as registro:`; o registro pode ser completado
+    # dentro do bloco (ex.: registro['linhas'] = len(resultado))
+    stack = _stack()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Etapas aninhadas: o pico da etapa externa é preservado antes de zerar o contador
+        _, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    frame = {'peak': 0, 'start_traced': tracemalloc.get_traced_memory()[0] if tracing else 0}
+    stack.append(frame)
+
+    record = {
+        'etapa': name,
+        'pai': stack[-2]['etapa'] if len(stack) > 1 else None,
+        'inicio': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'linhas': rows,
+        **extra,
+    }
+    frame['etapa'] = name
+    rss_inicio = current_rss_mb()
+    inicio = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['segundos'] = round(time.perf_counter() - inicio, 6)
+        rss_fim = current_rss_mb()
+        record['rss_mb'] = round(rss_fim, 1)
+        record['rss_delta_mb'] = round(rss_fim - rss_inicio, 1)
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame['peak'])
+            record['pico_mb'] = round((peak - frame['start_traced']) / 2**20, 1)
+            stack.pop()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        else:
+            record['pico_mb'] = None
+            stack.pop()
+        _emit(record)
+
+
+def timed(name=None):
+    # Decorador: mede cada chamada da função como uma etapa
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SectionTimer:
+    # Mede seções sequenciais de um script (ex.: as seções de uma página do Streamlit):
+    # cada chamada de `start` encerra a seção anterior
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._current = None
+
+    def start(self, name, rows=None):
+        self.end()
+        self._current = stage(f'{self.prefix}{name}', rows)
+        self._current.__enter__()
+
+    def end(self):
+        if self._current is not None:
+            current, self._current = self._current, None
+            current.__exit__(None, None, None)
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def to_jsonl(items=None):
+    items = records() if items is None else items
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in items)
@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# --- Estatísticas pré-agregadas para histogramas e boxplots ---
+# Calculadas com NumPy vetorizado; os gráficos são desenhados a partir delas, então o custo
+# de renderização depende do número de bins/grupos, e não do número de boletos.
+
+MAX_OUTLIERS = 500
+WHIS = 1.5
+
+
+@dataclass
+class HistogramSummary:
+    counts: np.ndarray
+    edges: np.ndarray
+
+
+def histogram_summary(values, bins=50):
+    values = np.asarray(values, dtype=float)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return HistogramSummary(counts, edges)
+
+
+def boxplot_summary(values, label=None, whis=WHIS, max_outliers=MAX_OUTLIERS, seed=0):
+    # Mesmo formato de matplotlib.cbook.boxplot_stats, aceito por Axes.bxp
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        # Grupo vazio (ex.: tabela filtrada ou segmento pequeno): resumo nulo, ignorado no desenho
+        return {'label': label, 'med': np.nan, 'q1': np.nan, 'q3': np.nan, 'iqr': np.nan, 'whislo': np.nan,
+                'whishi': np.nan, 'fliers': values, 'mean': np.nan, 'n': 0, 'n_outliers': 0}
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lo_limit, hi_limit = q1 - whis * iqr, q3 + whis * iqr
+
+    inside = values[(values >= lo_limit) & (values <= hi_limit)]
+    whislo = inside.min() if len(inside) else q1
+    whishi = inside.max() if len(inside) else q3
+
+    # Outliers: amostra limitada, preservando sempre os extremos
+    fliers = values[(values < lo_limit) | (values > hi_limit)]
+    n_outliers = len(fliers)
+    if n_outliers > max_outliers:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(n_outliers, size=max_outliers - 2, replace=False)
+        fliers = np.concatenate([fliers[sample], [fliers.min(), fliers.max()]])
+
+    return {
+        'label': label,
+        'med': med,
+        'q1': q1,
+        'q3': q3,
+        'iqr': iqr,
+        'whislo': whislo,
+        'whishi': whishi,
+        'fliers': fliers,
+        'mean': values.mean(),
+        'n': len(values),
+        'n_outliers': n_outliers,
+    }
+
+
+def grouped_boxplot_summaries(df, by, col, **kwargs):
+    # Um resumo por grupo, na ordem em que os grupos aparecem (como o seaborn)
+    data = df[[by, col]].dropna(subset=[col])
+    return [
+        boxplot_summary(values.to_numpy(), label=group, **kwargs)
+        for group, values in data.groupby(by, sort=False, observed=True)[col]
+    ]
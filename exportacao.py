@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Exportação dos dados filtrados ---
+# O arquivo só é gerado quando o download é pedido, em blocos de linhas (memória limitada ao
+# bloco), e fica guardado em disco pela assinatura do filtro: downloads repetidos reaproveitam.
+
+EXPORT_DIR = os.environ.get('NUCLEA_EXPORT_DIR', '.cache_exportacao')
+EXPORT_PREFIX = 'boletos_filtrados_'
+EXPORT_CHUNK_ROWS = 100_000
+MAX_EXPORTS = 16
+
+# Formato -> (extensão, MIME)
+FORMATS = {
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def filter_signature(versao, filters):
+    # filters: {dimensão: valores aceitos ou None}, como em indice_filtros.FilterIndex.select
+    items = sorted((dim, None if values is None else sorted(map(str, values))) for dim, values in filters.items())
+    return hashlib.sha256(repr((versao, items)).encode()).hexdigest()[:32]
+
+
+def export_path(signature, fmt, export_dir=EXPORT_DIR):
+    extension, _ = FORMATS[fmt]
+    return os.path.join(export_dir, f'{EXPORT_PREFIX}{signature}.{extension}')
+
+
+def iter_chunks(df, positions, decode, chunk_rows=EXPORT_CHUNK_ROWS):
+    # `decode` converte os códigos de identificadores de volta para hexadecimal, bloco a bloco
+    for start in range(0, len(positions), chunk_rows):
+        yield decode(df.iloc[positions[start:start + chunk_rows]])
+
+
+def write_csv_gz(chunks, path):
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def write_parquet(chunks, path):
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {'csv.gz': write_csv_gz, 'parquet': write_parquet}
+
+
+def _mtime(path):
+    # Outra sessão (thread) pode remover o arquivo entre a listagem e a leitura
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+def remove_old_exports(export_dir=EXPORT_DIR, max_exports=MAX_EXPORTS):
+    paths = [os.path.join(export_dir, name) for name in os.listdir(export_dir) if name.startswith(EXPORT_PREFIX) and not name.endswith('.tmp')]
+    mtimes = {path: _mtime(path) for path in paths}
+    existentes = [path for path, mtime in mtimes.items() if mtime is not None]
+    for path in sorted(existentes, key=mtimes.get)[:-max_exports]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def export_filtered(df, positions, decode, signature, fmt, export_dir=EXPORT_DIR):
+    path = export_path(signature, fmt, export_dir)
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(export_dir, exist_ok=True)
+    # Sufixo único por chamada: as sessões do Streamlit são threads do mesmo processo
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        WRITERS[fmt](iter_chunks(df, positions, decode), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    remove_old_exports(export_dir)
+    return path
+
+
+def open_export(df, positions, decode, signature, fmt, export_dir=EXPORT_DIR):
+    # Arquivo aberto em disco para o st.download_button: o conteúdo não passa por uma cópia em bytes aqui
+    return open(export_filtered(df, positions, decode, signature, fmt, export_dir), 'rb')
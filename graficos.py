@@ -0,0 +1,245 @@
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import diagnostico
+from estatisticas import boxplot_summary, grouped_boxplot_summaries, histogram_summary
+
+# --- Camada de renderização com cache ---
+# Os gráficos são desenhados com a API orientada a objetos (Figure), sem o estado global
+# do pyplot, porque o Streamlit renderiza as sessões em threads diferentes.
+# seaborn e matplotlib são importados dentro das funções de desenho: o app só paga esse custo
+# quando um gráfico fora do cache é desenhado, não na inicialização.
+
+MAX_CHARTS = 64
+MANIFEST_FILE = '.graficos_manifest.json'
+
+
+def chart_key(versao, chart_id, params):
+    return (versao, chart_id, tuple(sorted(params.items())))
+
+
+def key_digest(key):
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def figure_to_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class ChartCache:
+    # Cache LRU de imagens PNG prontas, por (versão dos dados, id do gráfico, parâmetros)
+
+    def __init__(self, max_entries=MAX_CHARTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def render(self, versao, chart_id, draw, **params):
+        # `draw(**params)` devolve a Figure; só é chamada quando a imagem não está em cache
+        key = chart_key(versao, chart_id, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        with diagnostico.stage(f'gráfico: {chart_id}'):
+            png = figure_to_png(draw(**params))
+
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return png
+
+
+class ChartManifest:
+    # Registro em disco das chaves dos gráficos já salvos num diretório de saída
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._entries = {}
+
+    def is_stale(self, filename, versao, chart_id, params):
+        digest = key_digest(chart_key(versao, chart_id, params))
+        path = os.path.join(self.output_dir, filename)
+        return self._entries.get(filename) != digest or not os.path.exists(path)
+
+    def record(self, filename, versao, chart_id, params):
+        self._entries[filename] = key_digest(chart_key(versao, chart_id, params))
+        with open(self.path, 'w') as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+
+
+# --- Gráficos ---
+def _new_axes(figsize):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+
+def _rotate_xticks(ax):
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+
+
+def status_distribution(status_counts, figsize=(8, 5)):
+    import seaborn as sns
+
+    fig, ax = _new_axes(figsize)
+    sns.barplot(x=status_counts.index, y=status_counts.values, hue=status_counts.index, palette="viridis", legend=False, ax=ax)
+    ax.set_title('Distribuição do Status de Pagamento dos Boletos')
+    ax.set_ylabel('Percentual (%)')
+    ax.set_xlabel('Status de Pagamento')
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    return fig
+
+
+def top_default_rate(rates, title, xlabel, ylabel, palette, figsize=(10, 6)):
+    import seaborn as sns
+
+    top = rates.head(10)
+    x = top.index.astype(str)
+    fig, ax = _new_axes(figsize)
+    sns.barplot(x=x, y=top.values, hue=x, palette=palette, legend=False, ax=ax)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel(xlabel)
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    return fig
+
+
+def draw_histogram(ax, summary, **kwargs):
+    # Um "dado" por bin, ponderado pela contagem: mesmo visual do hist sobre as linhas
+    ax.hist(summary.edges[:-1], bins=summary.edges, weights=summary.counts, **kwargs)
+
+
+def draw_boxplots(ax, summaries, xlabel=None, ylabel=None):
+    import seaborn as sns
+
+    # Grupos sem valores não têm caixa
+    summaries = [summary for summary in summaries if summary['n']]
+    ax.set_xlabel(xlabel or '')
+    ax.set_ylabel(ylabel or '')
+    if not summaries:
+        ax.text(0.5, 0.5, 'Sem dados', ha='center', va='center', transform=ax.transAxes)
+        return
+    colors = sns.color_palette(n_colors=len(summaries))
+    artists = ax.bxp(
+        summaries, patch_artist=True, widths=0.6,
+        medianprops={'color': '0.15'}, flierprops={'marker': 'd', 'markersize': 4}
+    )
+    for box, color in zip(artists['boxes'], colors):
+        box.set_facecolor(color)
+
+
+def value_histogram(values, bins=50, figsize=(8, 5)):
+    fig, ax = _new_axes(figsize)
+    draw_histogram(ax, histogram_summary(values, bins), alpha=0.7, label='Valor Nominal', edgecolor='black')
+    ax.set_xlabel('Valor (R$)')
+    ax.set_ylabel('Frequência')
+    ax.set_title('Distribuição de Valores Nominais')
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def value_boxplot_zoom(values, zoom_limit, figsize=(8, 6)):
+    fig, ax = _new_axes(figsize)
+    draw_boxplots(ax, [boxplot_summary(values, label='')], ylabel='vlr_nominal')
+    if math.isfinite(zoom_limit):
+        ax.set_ylim(0, zoom_limit)
+    ax.set_title('Boxplot do Valor Nominal (Zoom)')
+    ax.set_ylabel('Valor Nominal (R$)')
+    fig.tight_layout()
+    return fig
+
+
+def monthly_default_rate(rates, figsize=(12, 6), title='Evolução Mensal da Taxa de Boletos "Em Aberto" (Potencial Inadimplência)',
+                         xlabel='Mês de Emissão', peaks=None, max_ticks=None):
+    # peaks: períodos destacados (picos detectados); max_ticks limita os rótulos de séries longas (diárias)
+    from matplotlib.ticker import MaxNLocator
+
+    fig, ax = _new_axes(figsize)
+    x = rates.index.astype(str)
+    ax.plot(x, rates.values, marker='o' if len(rates) <= 100 else None, linewidth=2)
+    if peaks is not None and len(peaks):
+        destaques = rates.index.isin(peaks)
+        ax.scatter(x[destaques], rates.values[destaques], color='red', s=80, zorder=3, label='Pico detectado')
+        ax.legend()
+    ax.set_title(title)
+    ax.set_ylabel('Taxa de Inadimplência (%)')
+    ax.set_xlabel(xlabel)
+    if max_ticks:
+        ax.xaxis.set_major_locator(MaxNLocator(max_ticks))
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    return fig
+
+
+def vintage_curves(curves, figsize=(12, 6)):
+    # Uma curva por safra (linhas de `curves`): % ainda não pago por dias após o vencimento
+    fig, ax = _new_axes(figsize)
+    for safra, curve in curves.iterrows():
+        ax.plot(curve.index, curve.values, linewidth=2, label=str(safra))
+    ax.set_title('Curvas de Safra: Boletos Não Pagos por Dias Após o Vencimento')
+    ax.set_ylabel('Boletos Não Pagos (%)')
+    ax.set_xlabel('Dias Após o Vencimento')
+    ax.legend(title='Mês de Emissão')
+    fig.tight_layout()
+    return fig
+
+
+def threshold_heatmap(contagens, figsize=(12, 7)):
+    # contagens: pagadores por (limite de liquidez, limite de taxa), como ThresholdSweep.grid
+    import seaborn as sns
+
+    fig, ax = _new_axes(figsize)
+    sns.heatmap(
+        contagens.iloc[::-1], annot=True, fmt='d', annot_kws={'fontsize': 6}, cmap='YlOrRd', ax=ax,
+        xticklabels=[f'{v:.0%}' for v in contagens.columns], yticklabels=[f'{v:.2f}' for v in contagens.index[::-1]]
+    )
+    ax.set_title('Pagadores com Liquidez Abaixo do Limite e Taxa de Inadimplência Até o Limite')
+    ax.set_xlabel('Taxa de Inadimplência Até')
+    ax.set_ylabel('Liquidez do Sacado (1 Mês) Abaixo de')
+    fig.tight_layout()
+    return fig
+
+
+def score_scatter(df_pagador_agg, figsize=(10, 6)):
+    import seaborn as sns
+
+    fig, ax = _new_axes(figsize)
+    sns.scatterplot(x='score_materialidade', y='taxa_inadimplencia', data=df_pagador_agg, ax=ax)
+    ax.set_title('Score Materialidade vs. Taxa de Inadimplência (por Pagador)')
+    ax.set_xlabel('Score Materialidade V2 (Média por Pagador)')
+    ax.set_ylabel('Taxa de Inadimplência (Boletos "Em Aberto")')
+    fig.tight_layout()
+    return fig
+
+
+def risk_boxplot(df_pagador_agg, col, title='Por Grupo de Risco', figsize=(6, 4)):
+    fig, ax = _new_axes(figsize)
+    draw_boxplots(ax, grouped_boxplot_summaries(df_pagador_agg, 'alto_risco', col), xlabel='alto_risco', ylabel=col)
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
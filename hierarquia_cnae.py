@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# --- Hierarquia da CNAE 2.0 ---
+# O código da subclasse (7 dígitos, ex.: 4645101 = 46.45-1/01) é convertido uma única vez, na
+# dimensão de pagadores, em códigos inteiros de cada nível. Contagens e volumes são pré-agregados
+# em todos os níveis a partir das medidas por pagador do cubo, então o detalhamento e o mínimo de
+# boletos por segmento mudam sem reler os boletos.
+
+CNAE_LEVELS = ['secao', 'divisao', 'grupo', 'classe', 'subclasse']
+LEVEL_LABELS = {
+    'secao': 'Seção',
+    'divisao': 'Divisão',
+    'grupo': 'Grupo',
+    'classe': 'Classe',
+    'subclasse': 'Subclasse',
+}
+LEVEL_COLS = {level: f'cnae_{level}' for level in CNAE_LEVELS}
+
+# Dígitos finais descartados da subclasse para chegar a cada nível numérico
+DIVISORS = {'divisao': 100_000, 'grupo': 10_000, 'classe': 100, 'subclasse': 1}
+
+# Primeira divisão de cada seção (letra)
+SECTION_STARTS = {
+    1: 'A', 5: 'B', 10: 'C', 35: 'D', 36: 'E', 41: 'F', 45: 'G', 49: 'H', 55: 'I', 58: 'J', 64: 'K',
+    68: 'L', 69: 'M', 77: 'N', 84: 'O', 85: 'P', 86: 'Q', 90: 'R', 94: 'S', 97: 'T', 99: 'U',
+}
+
+MEASURES = ['boletos', 'vlr_nominal', 'inadimplentes']
+
+
+def parse_cnae(cd_cnae_prin):
+    # Um código inteiro por nível; a seção é a letra da faixa de divisões
+    subclasse = pd.to_numeric(cd_cnae_prin, errors='coerce').round().astype('Int64')
+    niveis = pd.DataFrame(index=cd_cnae_prin.index)
+    for level, divisor in DIVISORS.items():
+        niveis[LEVEL_COLS[level]] = (subclasse // divisor).astype('Int32')
+
+    divisao = niveis[LEVEL_COLS['divisao']]
+    starts = np.array(list(SECTION_STARTS))
+    letras = np.array(list(SECTION_STARTS.values()), dtype=object)
+    posicao = np.searchsorted(starts, divisao.fillna(0).to_numpy(dtype=np.int64), side='right') - 1
+    secao = pd.Series(letras[posicao.clip(0)], index=niveis.index).where(divisao.notna().to_numpy() & (posicao >= 0))
+    niveis.insert(0, LEVEL_COLS['secao'], secao)
+    return niveis
+
+
+def format_code(level, code):
+    if level == 'secao':
+        return str(code)
+    code = int(code)
+    if level == 'divisao':
+        return f'{code:02d}'
+    if level == 'grupo':
+        return f'{code // 10:02d}.{code % 10}'
+    if level == 'classe':
+        return f'{code // 1000:02d}.{code // 10 % 100:02d}-{code % 10}'
+    return f'{code // 1000:04d}-{code // 100 % 10}/{code % 100:02d}'
+
+
+class CnaeHierarchy:
+    # niveis: {nível: DataFrame com os códigos do nível e dos níveis acima e as medidas somadas}
+
+    def __init__(self, niveis):
+        self.niveis = niveis
+
+    def rollup(self, level, parent=None, min_boletos=0):
+        # parent: (nível acima, código) restringe aos segmentos abaixo desse código
+        df = self.niveis[level]
+        if parent is not None:
+            parent_level, code = parent
+            df = df[df[LEVEL_COLS[parent_level]] == code]
+        df = df[df['boletos'] >= min_boletos]
+        return df.set_index(LEVEL_COLS[level])[MEASURES]
+
+    def children(self, level, parent=None):
+        return self.rollup(level, parent).index.tolist()
+
+    def default_rate(self, level, parent=None, min_boletos=0):
+        counts = self.rollup(level, parent, min_boletos)
+        return counts['inadimplentes'] / counts['boletos'] * 100
+
+
+def build_hierarchy(medidas, dimensao):
+    # medidas: medidas por pagador (índice = código do pagador), como AggregateCube.pagadores;
+    # pagadores sem CNAE ficam fora da hierarquia
+    df = medidas[MEASURES].join(dimensao[list(LEVEL_COLS.values())])
+    niveis = {}
+    for i, level in enumerate(CNAE_LEVELS):
+        chaves = [LEVEL_COLS[nivel] for nivel in CNAE_LEVELS[:i + 1]]
+        niveis[level] = df.groupby(chaves, observed=True)[MEASURES].sum().reset_index()
+    return CnaeHierarchy(niveis)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Identificadores SHA-256 em hexadecimal (64 caracteres)
+ID_COLS = ['id_boleto', 'id_pagador', 'id_beneficiario']
+
+DIGEST_SIZE = 32
+CODE_DTYPE = np.int32
+HEX_CHARS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def is_valid_hex(hex_values):
+    # Tamanho e caracteres: um valor com o tamanho certo mas fora do hexadecimal quebraria bytes.fromhex
+    return pd.Series(hex_values, copy=False).str.fullmatch(f'[0-9a-fA-F]{{{2 * DIGEST_SIZE}}}', na=False).to_numpy(dtype=bool)
+
+
+def hex_to_digests(hex_values):
+    raw = bytes.fromhex(''.join(hex_values))
+    return np.frombuffer(raw, dtype=f'S{DIGEST_SIZE}')
+
+
+def digests_to_hex(digests):
+    # Conversão vetorizada: cada byte vira dois caracteres hexadecimais
+    raw = np.ascontiguousarray(digests).view(np.uint8).reshape(-1, DIGEST_SIZE)
+    chars = np.empty((len(raw), 2 * DIGEST_SIZE), dtype=np.uint8)
+    chars[:, 0::2] = HEX_CHARS[raw >> 4]
+    chars[:, 1::2] = HEX_CHARS[raw & 0x0F]
+    return chars.view(f'S{2 * DIGEST_SIZE}').ravel().astype(str)
+
+
+class IdentifierDictionary:
+    # Dicionário de identificadores: código inteiro denso -> digest de 32 bytes
+
+    def __init__(self, digests):
+        self.digests = np.asarray(digests, dtype=f'S{DIGEST_SIZE}')
+        self._index = None
+
+    def __len__(self):
+        return len(self.digests)
+
+    @classmethod
+    def from_hex(cls, *columns):
+        # Um único dicionário para várias colunas (ex.: id_pagador e id_cnpj).
+        # Valores malformados (há linhas quebradas na base auxiliar) recebem -1.
+        values = pd.concat([pd.Series(col, copy=False) for col in columns], ignore_index=True)
+        valid = is_valid_hex(values)
+        codes = np.full(len(values), -1, dtype=CODE_DTYPE)
+        codes[valid], uniques = pd.factorize(values[valid])
+        dictionary = cls(hex_to_digests(uniques))
+        dictionary._index = pd.Index(uniques)
+
+        encoded, start = [], 0
+        for col in columns:
+            encoded.append(codes[start:start + len(col)])
+            start += len(col)
+        return dictionary, encoded
+
+    def index(self):
+        if self._index is None:
+            self._index = pd.Index(self.decode(np.arange(len(self))))
+        return self._index
+
+    def encode(self, hex_values):
+        # Identificadores desconhecidos recebem -1
+        return self.index().get_indexer(hex_values).astype(CODE_DTYPE)
+
+    def encode_or_add(self, hex_values):
+        # Como encode, mas acrescenta ao dicionário os identificadores ainda não vistos
+        hex_values = pd.Series(hex_values, copy=False)
+        codes = self.encode(hex_values)
+        novos = (codes < 0) & is_valid_hex(hex_values)
+        if novos.any():
+            uniques = pd.unique(hex_values[novos])
+            self.digests = np.concatenate([self.digests, hex_to_digests(uniques)])
+            self._index = self.index().append(pd.Index(uniques))
+            codes[novos] = self._index.get_indexer(hex_values[novos])
+        return codes
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        hex_values = np.full(len(codes), None, dtype=object)
+        valid = codes >= 0
+        hex_values[valid] = digests_to_hex(self.digests[codes[valid]])
+        return hex_values
+
+    def to_arrow(self):
+        buffer = pa.py_buffer(self.digests.tobytes())
+        digests = pa.FixedSizeBinaryArray.from_buffers(pa.binary(DIGEST_SIZE), len(self), [None, buffer])
+        return pa.table({'digest': digests})
+
+    @classmethod
+    def from_arrow(cls, table):
+        digests = table.column('digest').combine_chunks()
+        buffer = digests.buffers()[1]
+        return cls(np.frombuffer(buffer, dtype=f'S{DIGEST_SIZE}', count=len(digests), offset=digests.offset * DIGEST_SIZE))
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# --- Índices de filtro para as dimensões de baixa cardinalidade ---
+# Cada dimensão vira um vetor de códigos e uma lista de postagem (posições das linhas de cada
+# valor). Um filtro parte da dimensão mais seletiva e testa as demais só nas posições restantes,
+# sem criar máscaras do tamanho da base a cada interação.
+
+FILTER_DIMS = ['status_pagamento', 'tipo_especie', 'uf', 'cnae_4digitos', 'mes_emissao']
+PAGE_SIZE = 50
+
+
+class _DimensionIndex:
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series)
+        self.codes = codes.astype(np.int32)
+        # Valores na ordem em que aparecem na base, como em Series.unique() sem os nulos
+        self.values = list(uniques)
+        self._lookup = {value: code for code, value in enumerate(self.values)}
+
+        # Listas de postagem no formato CSR: positions[offsets[c]:offsets[c + 1]] são as linhas do código c
+        valid = np.flatnonzero(self.codes >= 0)
+        self.positions = valid[np.argsort(self.codes[valid], kind='stable')].astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.codes[valid], minlength=len(self.values)))])
+
+    def selected_codes(self, values):
+        return np.array([self._lookup[value] for value in values if value in self._lookup], dtype=np.int32)
+
+    def count(self, codes):
+        return int((self.offsets[codes + 1] - self.offsets[codes]).sum())
+
+    def postings(self, codes):
+        return np.sort(np.concatenate(
+            [self.positions[self.offsets[code]:self.offsets[code + 1]] for code in codes] or [np.empty(0, dtype=np.int64)]
+        ))
+
+    def matches(self, codes, positions):
+        mask = np.zeros(len(self.values), dtype=bool)
+        mask[codes] = True
+        row_codes = self.codes[positions]
+        return (row_codes >= 0) & mask[row_codes.clip(0)]
+
+
+class FilterIndex:
+
+    def __init__(self, df, dims=FILTER_DIMS):
+        self.df = df
+        self.dims = {dim: _DimensionIndex(df[dim]) for dim in dims}
+        self._ranks = {}
+
+    def values(self, dim):
+        return self.dims[dim].values
+
+    def select(self, filters):
+        # filters: {dimensão: valores aceitos}; None ou ausente = sem filtro; lista vazia = nenhuma linha
+        active = [(self.dims[dim], self.dims[dim].selected_codes(values)) for dim, values in filters.items() if values is not None]
+        if not active:
+            return np.arange(len(self.df))
+
+        active.sort(key=lambda item: item[0].count(item[1]))
+        index, codes = active[0]
+        positions = index.postings(codes)
+        for index, codes in active[1:]:
+            positions = positions[index.matches(codes, positions)]
+        return positions
+
+    def count(self, filters):
+        return len(self.select(filters))
+
+    def _sort_ranks(self, col, ascending):
+        # Posição de cada linha na ordenação completa da coluna (nulos no fim), calculada uma vez
+        key = (col, ascending)
+        if key not in self._ranks:
+            values = self.df[col].reset_index(drop=True)
+            order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            ranks = np.empty(len(order), dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            self._ranks[key] = ranks
+        return self._ranks[key]
+
+    def page(self, positions, sort_by=None, ascending=True, page=1, page_size=PAGE_SIZE):
+        # Devolve só as linhas da página pedida (1-based) do resultado ordenado
+        start = (page - 1) * page_size
+        if sort_by is None:
+            return self.df.iloc[positions[start:start + page_size]]
+
+        ranks = self._sort_ranks(sort_by, ascending)[positions]
+        stop = min(start + page_size, len(positions))
+        if stop <= start:
+            return self.df.iloc[[]]
+        # Só as primeiras `stop` posições precisam ser ordenadas
+        if stop < len(positions):
+            top = np.argpartition(ranks, stop - 1)[:stop]
+        else:
+            top = np.arange(len(positions))
+        top = top[np.argsort(ranks[top])]
+        return self.df.iloc[positions[top[start:stop]]]
+
+
+def n_pages(n_rows, page_size=PAGE_SIZE):
+    return max(1, -(-n_rows // page_size))
@@ -0,0 +1,39 @@
+import argparse
+
+import cache_dados
+from preparacao_dados import ARQUIVO_AUXILIAR, ARQUIVO_BOLETOS
+
+# --- Carga incremental ---
+# Um arquivo delta tem as mesmas colunas da base de boletos, com boletos novos e boletos
+# atualizados (pagamento, tipo de baixa). A carga faz upsert por id_boleto sobre a versão
+# corrente, publica uma nova versão no cache e o dashboard passa a usá-la no próximo rerun.
+# Os arquivos delta precisam ser mantidos: se o cache se perder, eles são reaplicados sobre a base.
+
+
+def ingest_delta(path_delta, path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR, cache_dir=cache_dados.CACHE_DIR):
+    data = cache_dados.load_prepared_data(path_boletos, path_auxiliar, cache_dir)
+    atual = cache_dados.read_current(cache_dir)
+
+    data, registro = cache_dados.apply_delta_file(data, path_delta, path_auxiliar)
+    atual = dict(atual, versao=data.versao, deltas=atual['deltas'] + [registro])
+    cache_dados.publish(data, atual, cache_dir)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aplica um arquivo de boletos novos/atualizados à versão corrente dos dados.')
+    parser.add_argument('delta', nargs='+', help='Arquivos CSV com boletos novos ou atualizados, aplicados na ordem.')
+    parser.add_argument('--boletos', default=ARQUIVO_BOLETOS)
+    parser.add_argument('--auxiliar', default=ARQUIVO_AUXILIAR)
+    parser.add_argument('--cache', default=cache_dados.CACHE_DIR)
+    args = parser.parse_args()
+
+    for path_delta in args.delta:
+        data = ingest_delta(path_delta, args.boletos, args.auxiliar, args.cache)
+        substituidos = len(data.delta.removidos)
+        print(f"{path_delta}: {data.delta.n_novos - substituidos:,} boletos novos, {substituidos:,} atualizados")
+        print(f"   Versão publicada: {data.versao} ({len(data.boletos):,} boletos)")
+
+
+if __name__ == '__main__':
+    main()
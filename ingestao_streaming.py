@@ -0,0 +1,148 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from identificadores import IdentifierDictionary
+from preparacao_dados import (
+    ARQUIVO_AUXILIAR,
+    ARQUIVO_BOLETOS,
+    PAYER_INDICATORS,
+    add_payment_columns,
+    clean_boletos,
+    cnae_4digitos,
+)
+from sketch_quantis import QuantileSketch
+
+CHUNK_SIZE = 500_000
+
+# Apenas as colunas usadas pelos agregados são lidas de cada bloco
+STREAM_COLS = [
+    'id_pagador', 'dt_emissao', 'dt_vencimento', 'dt_pagamento',
+    'vlr_nominal', 'vlr_baixa', 'tipo_baixa', 'tipo_especie',
+]
+
+
+def fold(acc, partial):
+    return partial if acc is None else acc.add(partial, fill_value=0)
+
+
+def default_counts(chunk, keys):
+    return chunk.groupby(keys, observed=True)['inadimplente'].agg(boletos='count', inadimplentes='sum')
+
+
+def default_rate(counts):
+    return counts['inadimplentes'] / counts['boletos'] * 100
+
+
+class StreamingAggregates:
+    # Acumuladores online: memória proporcional ao bloco e ao número de pagadores, não ao arquivo
+
+    def __init__(self, df_auxiliar):
+        df_auxiliar = df_auxiliar.rename(columns={'id_cnpj': 'id_pagador'})
+        self.payers, (codes,) = IdentifierDictionary.from_hex(df_auxiliar['id_pagador'])
+        df_auxiliar['id_pagador'] = codes
+        self.auxiliar = df_auxiliar[codes >= 0].drop_duplicates('id_pagador').set_index('id_pagador')
+
+        self.n_boletos = 0
+        self.status_counts = None
+        self.monthly = None
+        self.by_especie = None
+        self.valores = QuantileSketch()
+        self.payer_boletos = np.zeros(len(self.payers), dtype=np.int64)
+        self.payer_inadimplentes = np.zeros(len(self.payers), dtype=np.int64)
+
+    def update(self, chunk):
+        # Join com a base auxiliar pelos códigos de pagador
+        chunk['id_pagador'] = self.payers.encode_or_add(chunk['id_pagador'])
+        chunk = add_payment_columns(clean_boletos(chunk))
+
+        self.n_boletos += len(chunk)
+        self.status_counts = fold(self.status_counts, chunk['status_pagamento'].value_counts())
+        mes_emissao = chunk['dt_emissao'].dt.to_period('M').rename('mes_emissao')
+        self.monthly = fold(self.monthly, default_counts(chunk, mes_emissao))
+        self.by_especie = fold(self.by_especie, default_counts(chunk, 'tipo_especie'))
+        self.valores.update(chunk['vlr_nominal'].to_numpy())
+
+        n_payers = len(self.payers)
+        # Pagador malformado (código -1) entra nos totais, mas não na contagem por pagador
+        codes = chunk['id_pagador'].to_numpy()
+        validos = codes >= 0
+        self.payer_boletos = self._grow(self.payer_boletos, n_payers) + np.bincount(codes[validos], minlength=n_payers)
+        self.payer_inadimplentes = self._grow(self.payer_inadimplentes, n_payers) + np.bincount(
+            codes[validos], weights=chunk['inadimplente'].to_numpy()[validos], minlength=n_payers
+        ).astype(np.int64)
+
+    @staticmethod
+    def _grow(values, size):
+        return np.pad(values, (0, size - len(values)))
+
+    # --- Resultados ---
+    def default_rate_total(self):
+        return self.payer_inadimplentes.sum() / self.n_boletos * 100
+
+    def status_distribution(self):
+        return (self.status_counts / self.n_boletos * 100).sort_values(ascending=False)
+
+    def monthly_default_rate(self):
+        return default_rate(self.monthly.sort_index())
+
+    def default_rate_by_especie(self):
+        return default_rate(self.by_especie).sort_values(ascending=False)
+
+    def value_quantile(self, q):
+        return self.valores.quantile(q)
+
+    def payer_counts(self):
+        counts = pd.DataFrame({'boletos': self.payer_boletos, 'inadimplentes': self.payer_inadimplentes})
+        counts.index.name = 'id_pagador'
+        return counts[counts['boletos'] > 0]
+
+    def cnae_default_rate(self, min_boletos=50):
+        # O CNAE é atributo do pagador: basta reagrupar os acumuladores por pagador
+        counts = self.payer_counts()
+        cnae = cnae_4digitos(self.auxiliar['cd_cnae_prin'].reindex(counts.index))
+        by_cnae = counts.groupby(cnae.to_numpy()).sum()
+        by_cnae.index.name = 'cnae_4digitos'
+        return default_rate(by_cnae[by_cnae['boletos'] >= min_boletos])
+
+    def payer_aggregate(self):
+        counts = self.payer_counts()
+        indicators = self.auxiliar[list(PAYER_INDICATORS.values())].reindex(counts.index)
+        indicators.columns = list(PAYER_INDICATORS)
+        indicators.insert(0, 'taxa_inadimplencia', counts['inadimplentes'] / counts['boletos'])
+        return indicators.reset_index()
+
+
+def stream_aggregates(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR, chunksize=CHUNK_SIZE):
+    aggregates = StreamingAggregates(pd.read_csv(path_auxiliar, sep=','))
+    for chunk in pd.read_csv(path_boletos, sep=',', usecols=STREAM_COLS, chunksize=chunksize):
+        aggregates.update(chunk)
+    return aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agregados da base de boletos lida em blocos.')
+    parser.add_argument('--boletos', default=ARQUIVO_BOLETOS)
+    parser.add_argument('--auxiliar', default=ARQUIVO_AUXILIAR)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    aggregates = stream_aggregates(args.boletos, args.auxiliar, args.chunksize)
+
+    print(f"\nBoletos processados: {aggregates.n_boletos:,}")
+    print(f"Taxa de Inadimplência Geral: {aggregates.default_rate_total():.2f}%")
+    print(f"99º Percentil do Valor Nominal (aprox.): R$ {aggregates.value_quantile(0.99):,.2f}")
+    print("\nDistribuição do Status de Pagamento (%):")
+    print(aggregates.status_distribution())
+    print("\nInadimplência Mensal - Top 5:")
+    print(aggregates.monthly_default_rate().sort_values(ascending=False).head())
+    print("\nInadimplência por Tipo de Espécie (%):")
+    print(aggregates.default_rate_by_especie())
+    print("\nImpacto do CNAE (Top 5 Inadimplência):")
+    print(aggregates.cnae_default_rate().sort_values(ascending=False).head())
+    print(f"\nPagadores agregados: {len(aggregates.payer_aggregate()):,}")
+
+
+if __name__ == '__main__':
+    main()
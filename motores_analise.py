@@ -0,0 +1,273 @@
+import abc
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from identificadores import CODE_DTYPE
+from preparacao_dados import PAYER_INDICATORS, payer_rows
+
+# --- Motores de consulta para as análises ---
+# As análises (status, inadimplência por espécie/mês/CNAE, agregação por pagador, correlações,
+# casos extremos) são escritas uma única vez em AnalysisBackend, sobre poucas primitivas:
+# contagens agrupadas, a tabela por pagador, correlações e a contagem de casos extremos.
+# Cada motor implementa só as primitivas. As taxas saem de contagens inteiras, então os números
+# são idênticos entre motores (paridade verificada por paridade_backends.py).
+# DuckDB e Polars rodam no processo, em várias threads; são dependências opcionais, importadas
+# apenas quando o motor é escolhido (NUCLEA_BACKEND ou --backend).
+
+BACKEND = os.environ.get('NUCLEA_BACKEND', 'pandas')
+
+# Colunas dos fatos e da dimensão de pagadores enviadas aos motores
+FACT_COLS = ['id_pagador', 'dt_emissao', 'status_pagamento', 'tipo_especie', 'inadimplente']
+PAYER_KEYS = ['cnae_4digitos', 'uf']
+
+# Casos extremos: liquidez do sacado abaixo do limite e nenhum boleto em aberto
+LIMITE_LIQUIDEZ_BAIXA = 0.5
+
+
+class AnalysisBackend(abc.ABC):
+
+    def __init__(self, dados):
+        self.dados = dados
+
+    # --- Primitivas (implementadas por cada motor; um motor incompleto não pode ser instanciado) ---
+
+    @abc.abstractmethod
+    def _counts_by(self, key):
+        # DataFrame com as colunas `key`, boletos e inadimplentes; chaves nulas ficam de fora
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _payer_counts(self):
+        # DataFrame com id_pagador, boletos e inadimplentes
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _pairwise_correlation(self, cols):
+        # {(a, b): correlação de Pearson por pares completos} na tabela por pagador, para a < b
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _count_extreme_cases(self, limite):
+        raise NotImplementedError
+
+    # --- Análises ---
+
+    def counts_by(self, key):
+        counts = self._counts_by(key)
+        if key == 'mes_emissao':
+            index = pd.PeriodIndex(counts[key], freq='M', name=key)
+        else:
+            index = pd.Index(counts[key].astype(object), name=key)
+        counts = counts[['boletos', 'inadimplentes']].astype('int64').set_axis(index)
+        return counts.sort_index()
+
+    def default_rate_by(self, key, min_boletos=0):
+        counts = self.counts_by(key)
+        counts = counts[counts['boletos'] >= min_boletos]
+        return (counts['inadimplentes'] / counts['boletos'] * 100).rename('inadimplente')
+
+    def status_distribution(self):
+        counts = self.counts_by('status_pagamento')['boletos']
+        return (counts / counts.sum() * 100).sort_values(ascending=False).rename('proportion')
+
+    def especie_default_rate(self):
+        return self.default_rate_by('tipo_especie').sort_values(ascending=False)
+
+    def monthly_default_rate(self):
+        return self.default_rate_by('mes_emissao')
+
+    def cnae_default_rate(self, min_boletos=50):
+        return self.default_rate_by('cnae_4digitos', min_boletos)
+
+    def payer_aggregate(self):
+        # Taxa de inadimplência por pagador e indicadores da dimensão de pagadores
+        counts = self._payer_counts().astype({'id_pagador': 'int64', 'boletos': 'int64', 'inadimplentes': 'int64'})
+        counts = counts.sort_values('id_pagador')
+        indicadores = self.dados.pagadores[list(PAYER_INDICATORS.values())].astype('float64')
+        indicadores = payer_rows(indicadores.set_axis(list(PAYER_INDICATORS), axis=1), counts['id_pagador'].to_numpy())
+
+        df_pagador_agg = pd.DataFrame({
+            'id_pagador': counts['id_pagador'].to_numpy().astype(CODE_DTYPE),
+            'taxa_inadimplencia': (counts['inadimplentes'] / counts['boletos']).to_numpy(),
+        })
+        df_pagador_agg[list(PAYER_INDICATORS)] = indicadores.to_numpy()
+        df_pagador_agg['alto_risco'] = np.where(df_pagador_agg['taxa_inadimplencia'] > 0, 'Alto Risco', 'Baixo Risco')
+        return df_pagador_agg
+
+    def correlation(self, cols):
+        # Matriz de correlação por pares completos (como DataFrame.corr) na tabela por pagador
+        pares = self._pairwise_correlation(cols)
+        matriz = pd.DataFrame(np.eye(len(cols)), index=cols, columns=cols)
+        for (a, b), valor in pares.items():
+            matriz.loc[a, b] = matriz.loc[b, a] = valor
+        return matriz
+
+    def extreme_cases(self, limite=LIMITE_LIQUIDEZ_BAIXA):
+        # Pagadores com liquidez do sacado abaixo do limite e sem inadimplência
+        return int(self._count_extreme_cases(limite))
+
+
+def _pairs(cols):
+    return [(a, b) for i, a in enumerate(cols) for b in cols[i + 1:]]
+
+
+class PandasBackend(AnalysisBackend):
+
+    def __init__(self, dados):
+        super().__init__(dados)
+        self._lock = threading.Lock()
+        self._pagadores = None
+
+    def _facts(self, key):
+        if key in PAYER_KEYS:
+            return self.dados.with_payer_columns(self.dados.fact_columns(['id_pagador', 'inadimplente']), [key])
+        return self.dados.fact_columns([key, 'inadimplente'])
+
+    def _counts_by(self, key):
+        grouped = self._facts(key).groupby(key, observed=True)['inadimplente']
+        return grouped.agg(boletos='size', inadimplentes='sum').reset_index()
+
+    def _payer_counts(self):
+        grouped = self.dados.fact_columns(['id_pagador', 'inadimplente']).groupby('id_pagador')['inadimplente']
+        return grouped.agg(boletos='size', inadimplentes='sum').reset_index()
+
+    def _payer_table(self):
+        # Tabela por pagador calculada uma vez por instância (correlações e casos extremos)
+        with self._lock:
+            if self._pagadores is None:
+                self._pagadores = self.payer_aggregate()
+            return self._pagadores
+
+    def _pairwise_correlation(self, cols):
+        corr = self._payer_table()[cols].corr()
+        return {(a, b): corr.loc[a, b] for a, b in _pairs(cols)}
+
+    def _count_extreme_cases(self, limite):
+        df = self._payer_table()
+        return ((df['sacado_indice_liquidez_1m'] < limite) & (df['alto_risco'] == 'Baixo Risco')).sum()
+
+
+class DuckDBBackend(AnalysisBackend):
+    # Os DataFrames são registrados na conexão sem cópia (varredura via Arrow).
+    # Uma conexão não pode ser usada por várias threads ao mesmo tempo: as consultas são serializadas
+    # (cada consulta já usa todas as threads do DuckDB).
+
+    def __init__(self, dados):
+        import duckdb
+
+        super().__init__(dados)
+        self._lock = threading.Lock()
+        self._con = duckdb.connect()
+        self._con.register('boletos', dados.fact_columns(FACT_COLS))
+        self._con.register('pagadores', dados.pagadores[PAYER_KEYS + list(PAYER_INDICATORS.values())].reset_index())
+        indicadores = ', '.join(f'p.{col} AS {name}' for name, col in PAYER_INDICATORS.items())
+        self._con.execute(f"""
+            CREATE VIEW agregado_pagador AS
+            SELECT c.id_pagador, c.boletos, c.inadimplentes,
+                   c.inadimplentes / c.boletos AS taxa_inadimplencia, {indicadores}
+            FROM (
+                SELECT id_pagador, count(*) AS boletos, sum(inadimplente)::BIGINT AS inadimplentes
+                FROM boletos GROUP BY id_pagador
+            ) c
+            LEFT JOIN pagadores p ON p.id_pagador = c.id_pagador
+        """)
+
+    def _query(self, sql, params=None):
+        with self._lock:
+            return self._con.execute(sql, params).df()
+
+    def _counts_by(self, key):
+        if key == 'mes_emissao':
+            expr, join = "date_trunc('month', b.dt_emissao)", ''
+        elif key in PAYER_KEYS:
+            expr, join = f'p.{key}', 'LEFT JOIN pagadores p ON p.id_pagador = b.id_pagador'
+        else:
+            expr, join = f'b.{key}', ''
+        return self._query(f"""
+            SELECT {expr} AS {key}, count(*) AS boletos, sum(b.inadimplente)::BIGINT AS inadimplentes
+            FROM boletos b {join}
+            WHERE {expr} IS NOT NULL
+            GROUP BY 1
+        """)
+
+    def _payer_counts(self):
+        return self._query('SELECT id_pagador, boletos, inadimplentes FROM agregado_pagador')
+
+    def _pairwise_correlation(self, cols):
+        pares = _pairs(cols)
+        exprs = ', '.join(f'corr({a}, {b})' for a, b in pares)
+        valores = self._query(f'SELECT {exprs} FROM agregado_pagador').iloc[0].to_numpy()
+        return dict(zip(pares, valores))
+
+    def _count_extreme_cases(self, limite):
+        return self._query(
+            'SELECT count(*) AS n FROM agregado_pagador WHERE sacado_indice_liquidez_1m < ? AND inadimplentes = 0',
+            [limite]
+        )['n'].iloc[0]
+
+
+class PolarsBackend(AnalysisBackend):
+
+    def __init__(self, dados):
+        import polars as pl
+
+        super().__init__(dados)
+        self._pl = pl
+        self._boletos = pl.from_pandas(dados.fact_columns(FACT_COLS))
+        self._dimensao = pl.from_pandas(dados.pagadores[PAYER_KEYS + list(PAYER_INDICATORS.values())].reset_index())
+        self._agregado = (
+            self._boletos.lazy()
+            .group_by('id_pagador')
+            .agg(boletos=pl.len(), inadimplentes=pl.col('inadimplente').sum())
+            .join(self._dimensao.lazy(), on='id_pagador', how='left')
+            .with_columns(taxa_inadimplencia=pl.col('inadimplentes') / pl.col('boletos'))
+            .rename({col: name for name, col in PAYER_INDICATORS.items() if col != name})
+        )
+
+    def _counts_by(self, key):
+        pl = self._pl
+        frame = self._boletos.lazy()
+        if key == 'mes_emissao':
+            expr = pl.col('dt_emissao').dt.truncate('1mo')
+        else:
+            expr = pl.col(key)
+            if key in PAYER_KEYS:
+                frame = frame.join(self._dimensao.lazy().select('id_pagador', key), on='id_pagador', how='left')
+        return (
+            frame.group_by(expr.alias(key))
+            .agg(boletos=pl.len(), inadimplentes=pl.col('inadimplente').sum())
+            .drop_nulls(key)
+            .collect()
+            .to_pandas()
+        )
+
+    def _payer_counts(self):
+        return self._agregado.select('id_pagador', 'boletos', 'inadimplentes').collect().to_pandas()
+
+    def _pairwise_correlation(self, cols):
+        pl = self._pl
+        pares = _pairs(cols)
+        exprs = []
+        for i, (a, b) in enumerate(pares):
+            completos = pl.col(a).is_not_null() & pl.col(b).is_not_null()
+            exprs.append(pl.corr(pl.col(a).filter(completos), pl.col(b).filter(completos)).alias(str(i)))
+        valores = self._agregado.select(exprs).collect().row(0)
+        return dict(zip(pares, valores))
+
+    def _count_extreme_cases(self, limite):
+        pl = self._pl
+        filtro = (pl.col('sacado_indice_liquidez_1m') < limite) & (pl.col('inadimplentes') == 0)
+        return self._agregado.filter(filtro).select(pl.len()).collect().item()
+
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend, 'polars': PolarsBackend}
+
+
+def get_backend(dados, name=None):
+    name = name or BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Motor de análise desconhecido: {name} (opções: {', '.join(BACKENDS)})")
+    return BACKENDS[name](dados)
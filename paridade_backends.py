@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import pandas as pd
+
+import cache_dados
+import motores_analise
+from preparacao_dados import PAYER_INDICATORS
+
+# --- Paridade entre motores de análise ---
+# Roda todas as análises em cada motor e compara com o pandas (referência). As taxas vêm de
+# contagens inteiras e devem ser idênticas; as correlações, calculadas em cada motor, podem
+# diferir só na ordem das somas de ponto flutuante.
+
+CORR_TOLERANCE = 1e-9
+CORR_COLS = ['taxa_inadimplencia'] + list(PAYER_INDICATORS)
+
+
+def run_analyses(backend):
+    return {
+        'status de pagamento': backend.status_distribution(),
+        'inadimplência por espécie': backend.especie_default_rate(),
+        'inadimplência mensal': backend.monthly_default_rate(),
+        'inadimplência por CNAE': backend.cnae_default_rate(),
+        'inadimplência por UF': backend.default_rate_by('uf'),
+        'agregação por pagador': backend.payer_aggregate(),
+        'correlações': backend.correlation(CORR_COLS),
+        'casos extremos': backend.extreme_cases(),
+    }
+
+
+def compare(name, esperado, obtido):
+    try:
+        if name == 'correlações':
+            pd.testing.assert_frame_equal(obtido, esperado, check_exact=False, rtol=CORR_TOLERANCE, atol=CORR_TOLERANCE)
+        elif isinstance(esperado, pd.DataFrame):
+            pd.testing.assert_frame_equal(obtido, esperado, check_exact=True)
+        elif isinstance(esperado, pd.Series):
+            # Empates podem sair em ordem diferente depois do sort_values
+            pd.testing.assert_series_equal(obtido.sort_index(), esperado.sort_index(), check_exact=True)
+        elif esperado != obtido:
+            raise AssertionError(f'{obtido} != {esperado}')
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica se todos os motores de análise produzem os mesmos números.')
+    parser.add_argument('--backends', nargs='+', default=[name for name in motores_analise.BACKENDS if name != 'pandas'])
+    args = parser.parse_args()
+
+    dados = cache_dados.load_prepared_data()
+    print(f"{len(dados.boletos):,} boletos, {len(dados.pagadores):,} pagadores na dimensão")
+
+    inicio = time.perf_counter()
+    referencia = run_analyses(motores_analise.get_backend(dados, 'pandas'))
+    print(f"pandas: {time.perf_counter() - inicio:.2f}s (referência)")
+
+    falhas = 0
+    for name in args.backends:
+        try:
+            backend = motores_analise.get_backend(dados, name)
+        except ImportError as e:
+            print(f"{name}: ignorado ({e})")
+            continue
+        inicio = time.perf_counter()
+        resultados = run_analyses(backend)
+        segundos = time.perf_counter() - inicio
+
+        erros = {analise: compare(analise, referencia[analise], resultados[analise]) for analise in referencia}
+        erros = {analise: erro for analise, erro in erros.items() if erro}
+        falhas += len(erros)
+        print(f"{name}: {segundos:.2f}s, {'OK' if not erros else f'{len(erros)} divergência(s)'}")
+        for analise, erro in erros.items():
+            print(f"   {analise}: {erro}")
+
+    raise SystemExit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
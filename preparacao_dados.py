@@ -0,0 +1,266 @@
+import os
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import diagnostico
+import hierarquia_cnae
+from identificadores import ID_COLS, IdentifierDictionary
+
+# --- Fontes de dados ---
+# Podem ser trocadas por variáveis de ambiente (ex.: bases sintéticas de dados_sinteticos.py)
+ARQUIVO_BOLETOS = os.environ.get('NUCLEA_ARQUIVO_BOLETOS', 'base_boletos_fiap(in).csv')
+ARQUIVO_AUXILIAR = os.environ.get('NUCLEA_ARQUIVO_AUXILIAR', 'base_auxiliar_fiap(in).csv')
+
+DATE_COLS = ['dt_emissao', 'dt_vencimento', 'dt_pagamento']
+
+STATUS_EM_ABERTO = 'Em Aberto'
+STATUS_PAGO_ATRASADO = 'Pago Atrasado'
+STATUS_PAGO_EM_DIA = 'Pago em Dia'
+
+# Indicadores médios por pagador (nome na agregação -> coluna da base auxiliar)
+PAYER_INDICATORS = {
+    'score_materialidade': 'score_materialidade_v2',
+    'score_quantidade': 'score_quantidade_v2',
+    'media_atraso_dias_aux': 'media_atraso_dias',
+    'share_vl_inad_pag_bol_6_a_15d': 'share_vl_inad_pag_bol_6_a_15d',
+    'indicador_liquidez_quantitativo_3m': 'indicador_liquidez_quantitativo_3m',
+    'score_materialidade_evolucao': 'score_materialidade_evolucao',
+    'sacado_indice_liquidez_1m': 'sacado_indice_liquidez_1m',
+    'cedente_indice_liquidez_1m': 'cedente_indice_liquidez_1m',
+}
+
+
+@dataclass
+class Delta:
+    # Carga incremental aplicada sobre a versão `parent`
+    parent: str
+    # Linhas da versão anterior que saíram, substituídas pelo upsert
+    removidos: pd.DataFrame
+    # As últimas `n_novos` linhas dos boletos vieram do delta
+    n_novos: int
+
+    def novos(self, boletos):
+        return boletos.iloc[len(boletos) - self.n_novos:]
+
+
+@dataclass
+class PreparedData:
+    # Fatos: um boleto por linha; o pagador aparece só pelo código de id_pagador.
+    # Pode ser None quando há `leitor`: as colunas são lidas sob demanda (ver fact_columns).
+    _boletos: pd.DataFrame
+    # Dimensão de pagadores: atributos da base auxiliar, uma linha por código de id_pagador
+    pagadores: pd.DataFrame
+    identifiers: dict
+    # Fingerprint das fontes; identifica a versão dos dados para os caches derivados
+    versao: str = None
+    # Última carga incremental, quando a versão não é a base completa
+    delta: Delta = None
+    # leitor(colunas) devolve só essas colunas dos fatos e leitor.columns lista todas
+    # (ex.: cache_dados.TableReader, sobre o cache mapeado em memória)
+    leitor: object = None
+    _colunas: dict = field(default_factory=dict, repr=False)
+    _lock: object = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def boletos(self):
+        # A base inteira só é materializada quando alguém pede todas as colunas;
+        # as colunas já lidas por projeção são reaproveitadas
+        with self._lock:
+            if self._boletos is None:
+                self._boletos = self._read_columns(self.leitor.columns)
+                self._colunas.clear()
+            return self._boletos
+
+    @boletos.setter
+    def boletos(self, df):
+        self._boletos = df
+
+    def fact_columns(self, columns):
+        # Projeção: lê e guarda só as colunas pedidas; as páginas declaram as colunas que usam
+        with self._lock:
+            if self._boletos is not None:
+                return self._boletos[list(columns)]
+            return self._read_columns(columns)
+
+    def _read_columns(self, columns):
+        faltantes = [col for col in columns if col not in self._colunas]
+        if faltantes:
+            lidas = self.leitor(faltantes)
+            self._colunas.update({col: lidas[col] for col in faltantes})
+        if not columns:
+            return pd.DataFrame()
+        # concat não copia as colunas, que continuam compartilhadas entre as páginas
+        return pd.concat([self._colunas[col] for col in columns], axis=1)
+
+    def payer_columns(self, codes, columns=None):
+        # Busca só as colunas pedidas da dimensão, na ordem dos códigos (sem merge)
+        columns = list(self.pagadores.columns) if columns is None else list(columns)
+        return payer_rows(self.pagadores[columns], codes)
+
+    def with_payer_columns(self, df, columns=None):
+        # Junção preguiçosa: acrescenta a um recorte dos fatos apenas os atributos necessários
+        atributos = self.payer_columns(df['id_pagador'].to_numpy(), columns).set_axis(df.index)
+        return df.assign(**{col: atributos[col] for col in atributos.columns})
+
+    def decode_ids(self, df):
+        # Substitui os códigos pelos identificadores hexadecimais (exibição/exportação)
+        df = df.copy()
+        for col, dictionary in self.identifiers.items():
+            if col in df.columns:
+                df[col] = dictionary.decode(df[col].to_numpy())
+        return df
+
+
+def read_sources(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR):
+    with diagnostico.stage('leitura: boletos') as registro:
+        df_boletos = pd.read_csv(path_boletos, sep=',')
+        registro['linhas'] = len(df_boletos)
+    with diagnostico.stage('leitura: auxiliar') as registro:
+        df_auxiliar = pd.read_csv(path_auxiliar, sep=',')
+        registro['linhas'] = len(df_auxiliar)
+    return df_boletos, df_auxiliar
+
+
+def add_payment_columns(df):
+    # Criação de Variáveis Chave (vetorizada, sem apply linha a linha).
+    # Comparações com NaT resultam em False, como na versão com apply.
+    em_aberto = (df['tipo_baixa'] == STATUS_EM_ABERTO).to_numpy(dtype=bool)
+    pago_atrasado = (df['dt_pagamento'] > df['dt_vencimento']).to_numpy(dtype=bool)
+
+    status = np.full(len(df), STATUS_PAGO_EM_DIA, dtype=object)
+    status[pago_atrasado] = STATUS_PAGO_ATRASADO
+    status[em_aberto] = STATUS_EM_ABERTO
+    df['status_pagamento'] = status
+
+    # Dias negativos e pagamentos ausentes (NaN) viram 0
+    dias_atraso = (df['dt_pagamento'] - df['dt_vencimento']).dt.days
+    df['dias_atraso'] = dias_atraso.where(dias_atraso > 0, 0)
+    df['inadimplente'] = em_aberto.astype(np.int64)
+    return df
+
+
+def payer_rows(pagadores, codes):
+    # Linhas da dimensão de pagadores na ordem dos códigos. O código -1 (identificador malformado)
+    # não tem cadastro e vira uma linha nula, como no merge à esquerda; take/indexação por posição
+    # leriam a última linha da dimensão.
+    return pagadores.reindex(np.asarray(codes))
+
+
+def encode_identifiers(df_boletos, df_auxiliar):
+    # id_pagador e id_cnpj compartilham o mesmo dicionário, para o merge usar os códigos
+    identifiers = {}
+    for col in ID_COLS:
+        frames = [df_boletos, df_auxiliar] if col == 'id_pagador' else [df_boletos]
+        identifiers[col], codes = IdentifierDictionary.from_hex(*(frame[col] for frame in frames))
+        for frame, frame_codes in zip(frames, codes):
+            frame[col] = frame_codes
+    return identifiers
+
+
+def build_payer_dimension(df_auxiliar, n_payers):
+    # Índice denso pelo código do pagador (0..n_payers-1): pagadores sem cadastro ficam com nulos.
+    # O CNAE de 4 dígitos e os níveis da hierarquia CNAE são derivados aqui, uma vez por pagador.
+    # Linhas com identificador malformado (código -1) não correspondem a nenhum boleto e ficam de fora;
+    # um id_cnpj repetido na base auxiliar fica com a primeira linha (como em ingestao_streaming).
+    pagadores = df_auxiliar[df_auxiliar['id_pagador'] >= 0].drop_duplicates('id_pagador').set_index('id_pagador')
+    pagadores = pagadores.reindex(pd.RangeIndex(n_payers, name='id_pagador'))
+    pagadores['cnae_4digitos'] = cnae_4digitos(pagadores['cd_cnae_prin'])
+    return pagadores.join(hierarquia_cnae.parse_cnae(pagadores['cd_cnae_prin']))
+
+
+def cnae_4digitos(cd_cnae_prin):
+    # O CNAE se repete em muitos boletos: converte apenas os valores distintos
+    codes, uniques = pd.factorize(cd_cnae_prin, use_na_sentinel=False)
+    digitos = pd.Series(uniques).astype(str).str[:4].to_numpy()
+    return pd.Series(digitos[codes], index=cd_cnae_prin.index, name=cd_cnae_prin.name)
+
+
+def clean_boletos(df_boletos):
+    # Conversão de colunas de data
+    for col in DATE_COLS:
+        df_boletos[col] = pd.to_datetime(df_boletos[col], errors='coerce')
+
+    # Preenchimento de valores faltantes
+    df_boletos['tipo_baixa'] = df_boletos['tipo_baixa'].fillna(STATUS_EM_ABERTO)
+    df_boletos['vlr_baixa'] = df_boletos['vlr_baixa'].fillna(0)
+    return df_boletos
+
+
+def prepare_data(df_boletos, df_auxiliar):
+    # Renomear coluna para merge
+    df_auxiliar = df_auxiliar.rename(columns={'id_cnpj': 'id_pagador'})
+    with diagnostico.stage('preparação: identificadores', rows=len(df_boletos) + len(df_auxiliar)):
+        identifiers = encode_identifiers(df_boletos, df_auxiliar)
+
+    with diagnostico.stage('preparação: limpeza', rows=len(df_boletos)):
+        df_boletos = clean_boletos(df_boletos)
+    with diagnostico.stage('preparação: dimensão de pagadores', rows=len(df_auxiliar)):
+        pagadores = build_payer_dimension(df_auxiliar, len(identifiers['id_pagador']))
+
+    with diagnostico.stage('preparação: status de pagamento', rows=len(df_boletos)):
+        df_boletos = add_payment_columns(df_boletos)
+    return PreparedData(df_boletos, pagadores, identifiers)
+
+
+@diagnostico.timed('preparação: colunas derivadas')
+def add_derived_columns(df):
+    # Colunas derivadas calculadas na carga: as páginas nunca alteram o DataFrame compartilhado
+    df['mes_emissao'] = df['dt_emissao'].dt.to_period('M')
+    return df
+
+
+def load_and_prepare_data(path_boletos=ARQUIVO_BOLETOS, path_auxiliar=ARQUIVO_AUXILIAR):
+    with diagnostico.stage('load_and_prepare_data') as registro:
+        df_boletos, df_auxiliar = read_sources(path_boletos, path_auxiliar)
+        data = prepare_data(df_boletos, df_auxiliar)
+        data.boletos = add_derived_columns(data.boletos)
+        registro['linhas'] = len(data.boletos)
+    return data
+
+
+def align_dtypes(df, reference):
+    # Mesmos tipos da base já preparada; categorias novas entram no fim da lista de categorias
+    for col in reference.columns:
+        dtype = reference[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            novas = pd.Index(df[col].dropna().unique()).difference(dtype.categories)
+            reference[col] = reference[col].cat.add_categories(novas)
+            df[col] = df[col].astype(reference[col].dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df[reference.columns]
+
+
+@diagnostico.timed('carga incremental: upsert')
+def apply_delta(data, df_delta, df_auxiliar, versao):
+    # Upsert por id_boleto: boletos já existentes são substituídos pela versão do delta.
+    # Só as linhas do delta passam pela limpeza e pelas colunas derivadas.
+    identifiers = {col: IdentifierDictionary(dictionary.digests) for col, dictionary in data.identifiers.items()}
+    for col in ID_COLS:
+        df_delta[col] = identifiers[col].encode_or_add(df_delta[col])
+    df_delta = df_delta.drop_duplicates('id_boleto', keep='last')
+
+    # Pagadores novos ganham linhas na dimensão; os já cadastrados não mudam
+    pagadores = data.pagadores
+    n_payers = len(identifiers['id_pagador'])
+    if n_payers > len(pagadores):
+        df_auxiliar = df_auxiliar.rename(columns={'id_cnpj': 'id_pagador'})
+        df_auxiliar['id_pagador'] = identifiers['id_pagador'].encode(df_auxiliar['id_pagador'])
+        df_auxiliar = df_auxiliar[df_auxiliar['id_pagador'] >= len(pagadores)]
+        novos_pagadores = build_payer_dimension(df_auxiliar, n_payers).iloc[len(pagadores):]
+        pagadores = pagadores.copy()
+        novos_pagadores = align_dtypes(novos_pagadores, pagadores)
+        pagadores = pd.concat([pagadores, novos_pagadores])
+
+    novos = add_derived_columns(add_payment_columns(clean_boletos(df_delta)))
+
+    boletos = data.boletos.copy()
+    substituidos = boletos['id_boleto'].isin(novos['id_boleto']).to_numpy()
+    novos = align_dtypes(novos, boletos)
+
+    delta = Delta(data.versao, boletos[substituidos].reset_index(drop=True), len(novos))
+    boletos = pd.concat([boletos[~substituidos], novos], ignore_index=True)
+    return PreparedData(boletos, pagadores, identifiers, versao, delta)
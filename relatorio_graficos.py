@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import seaborn as sns
+
+import cache_dados
+from graficos import ChartManifest
+
+# --- Geração paralela dos gráficos do relatório ---
+# Cada gráfico é um job independente. Os workers abrem o cache Arrow do dataset preparado
+# por memory-map: todos compartilham as mesmas páginas somente leitura, sem cópia por processo.
+
+
+@dataclass
+class ChartJob:
+    filename: str
+    chart_id: str
+    # Função de graficos.py (precisa ser de nível de módulo para ir ao worker)
+    draw: object
+    # Entradas já agregadas, pequenas, enviadas junto com o job
+    data: dict = field(default_factory=dict)
+    # Argumento -> coluna do dataset compartilhado, lida no próprio worker
+    columns: dict = field(default_factory=dict)
+    # Parâmetros que, junto com a versão dos dados, identificam a imagem
+    params: dict = field(default_factory=dict)
+
+
+_dados = None
+
+
+def _init_worker(cache_path, versao, style):
+    global _dados
+    _dados = cache_dados.read_cache(cache_path, versao)
+    sns.set_style(style)
+
+
+def _run_job(job, output_dir, dados=None):
+    inicio = time.perf_counter()
+    dados = _dados if dados is None else dados
+    kwargs = dict(job.data)
+    # Cada processo lê do cache só as colunas dos seus gráficos
+    kwargs.update({arg: dados.fact_columns([col])[col] for arg, col in job.columns.items()})
+    kwargs.update(job.params)
+    job.draw(**kwargs).savefig(os.path.join(output_dir, job.filename))
+    return job.filename, time.perf_counter() - inicio
+
+
+def run_chart_jobs(jobs, output_dir, versao, cache_path, workers=None, style='whitegrid', dados=None):
+    # Devolve {arquivo: segundos}; gráficos já atualizados no diretório ficam com None.
+    # Com `dados` (só em execução serial) as colunas vêm desse dataset, sem reabrir o cache
+    # (ex.: recorte de um segmento em relatorio_segmentos.py).
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = ChartManifest(output_dir)
+    pending = {job.filename: job for job in jobs if manifest.is_stale(job.filename, versao, job.chart_id, job.params)}
+    timings = {job.filename: None for job in jobs}
+
+    if workers == 1:
+        # Execução serial no próprio processo (depuração, máquinas com um único núcleo)
+        if dados is None:
+            _init_worker(cache_path, versao, style)
+        results = [_run_job(job, output_dir, dados) for job in pending.values()]
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_path, versao, style)) as pool:
+            futures = [pool.submit(_run_job, job, output_dir) for job in pending.values()]
+            results = [future.result() for future in as_completed(futures)]
+    else:
+        results = []
+
+    for filename, seconds in results:
+        job = pending[filename]
+        manifest.record(job.filename, versao, job.chart_id, job.params)
+        timings[filename] = seconds
+    return timings
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import seaborn as sns
+
+import analise_completa_final
+import cache_dados
+import motores_analise
+import relatorio_graficos
+from preparacao_dados import PAYER_INDICATORS, PreparedData
+
+# --- Relatório EDA por segmento, em paralelo ---
+# O mesmo relatório de analise_completa_final.py (status, outliers, série mensal, ranking de CNAE,
+# correlações e gráficos) para cada UF e para as maiores divisões CNAE. Os dados são carregados e
+# preparados uma única vez (cache Arrow do dataset); cada worker abre o cache por memory-map, então
+# todos compartilham as mesmas páginas somente leitura, e copia só as linhas do seu segmento.
+# Os segmentos são independentes: maiores primeiro, para equilibrar a carga entre os workers.
+# Cada segmento tem seu diretório (tabelas CSV, resumo.json e gráficos); o índice resume todos.
+
+OUTPUT_DIR = os.environ.get('NUCLEA_SAIDA_SEGMENTOS', 'relatorios_segmentos')
+INDEX_FILE = 'indice.csv'
+SUMMARY_FILE = 'resumo.json'
+INDEX_COLUMNS = ['segmento', 'dimensao', 'valor', 'boletos', 'pagadores', 'vlr_nominal', 'taxa_inadimplencia',
+                 'p99_vlr_nominal', 'inadimplencia_outliers', 'mes_pico', 'inadimplencia_mes_pico', 'casos_extremos',
+                 'correlacao_liquidez_sacado', 'erro', 'segundos']
+
+# Dimensão de segmento -> coluna da dimensão de pagadores
+SEGMENT_DIMS = {'uf': 'uf', 'cnae': 'cnae_divisao'}
+TOP_CNAE = 10
+CORRELATION_COLS = ['taxa_inadimplencia'] + list(PAYER_INDICATORS)
+
+
+def segment_name(dim, valor):
+    if dim == 'cnae':
+        return f'cnae_{valor:02d}'
+    return f'{dim}_{valor}'
+
+
+def list_segments(dados, dims=tuple(SEGMENT_DIMS), top_cnae=TOP_CNAE):
+    # [(dimensão, valor, boletos)] do maior para o menor segmento; segmentos sem boletos ficam de fora
+    codes = dados.fact_columns(['id_pagador'])['id_pagador'].to_numpy()
+    # Pagador malformado (código -1) não tem UF nem CNAE: fica fora de todos os segmentos
+    boletos_por_pagador = np.bincount(codes[codes >= 0], minlength=len(dados.pagadores))
+    segmentos = []
+    for dim in dims:
+        boletos = pd.Series(boletos_por_pagador).groupby(dados.pagadores[SEGMENT_DIMS[dim]].to_numpy(), dropna=True).sum()
+        boletos = boletos[boletos > 0].sort_values(ascending=False)
+        if dim == 'cnae':
+            boletos = boletos.head(top_cnae)
+        # Divisões CNAE saem do groupby como float; o valor do segmento é o código inteiro
+        segmentos += [(dim, int(valor) if dim == 'cnae' else valor, int(n)) for valor, n in boletos.items()]
+    return sorted(segmentos, key=lambda segmento: -segmento[2])
+
+
+_dados = None
+
+
+def _init_worker(cache_path, versao, style):
+    global _dados
+    _dados = cache_dados.read_cache(cache_path, versao)
+    sns.set_style(style)
+
+
+def segment_data(dados, dim, valor):
+    # Recorte dos fatos nos pagadores do segmento; a dimensão de pagadores é compartilhada
+    no_segmento = (dados.pagadores[SEGMENT_DIMS[dim]] == valor).to_numpy(dtype=bool, na_value=False)
+    codes = dados.fact_columns(['id_pagador'])['id_pagador'].to_numpy()
+    mascara = (codes >= 0) & no_segmento[np.maximum(codes, 0)]
+    tabela = dados.leitor.table.filter(pa.array(mascara))
+    return PreparedData(None, dados.pagadores, dados.identifiers, dados.versao, leitor=cache_dados.TableReader(tabela))
+
+
+def segment_report(dados, output_dir, backend_name=None):
+    # Análises do relatório global sobre o recorte; tabelas, resumo e gráficos em output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    backend = motores_analise.get_backend(dados, backend_name)
+    df = dados.fact_columns(['vlr_nominal', 'inadimplente'])
+    df_pagador_agg = backend.payer_aggregate()
+
+    status_counts = backend.status_distribution()
+    sketch_nominal, p99_nominal, outlier_inadimplencia, taxa_geral_inadimplencia = analise_completa_final.outlier_analysis(df)
+    inadimplencia_mensal = backend.monthly_default_rate()
+    inadimplencia_por_cnae = backend.cnae_default_rate()
+    inadimplencia_por_especie = backend.especie_default_rate()
+    correlacoes = backend.correlation(CORRELATION_COLS)
+    n_extremos = backend.extreme_cases()
+
+    status_counts.to_csv(os.path.join(output_dir, 'status_pagamento.csv'))
+    inadimplencia_mensal.to_csv(os.path.join(output_dir, 'inadimplencia_mensal.csv'))
+    inadimplencia_por_cnae.sort_values(ascending=False).to_csv(os.path.join(output_dir, 'inadimplencia_por_cnae.csv'))
+    inadimplencia_por_especie.to_csv(os.path.join(output_dir, 'inadimplencia_por_especie.csv'))
+    correlacoes.to_csv(os.path.join(output_dir, 'correlacoes.csv'))
+
+    jobs = analise_completa_final.build_chart_jobs(
+        df_pagador_agg, status_counts, inadimplencia_por_especie, inadimplencia_mensal, inadimplencia_por_cnae,
+        zoom_limit=sketch_nominal.quantile(0.75) * 5
+    )
+    # Um processo por segmento: os gráficos do segmento são desenhados em série, sobre o recorte
+    relatorio_graficos.run_chart_jobs(jobs, output_dir, dados.versao, None, workers=1, dados=dados)
+
+    resumo = {
+        'boletos': len(df),
+        'pagadores': len(df_pagador_agg),
+        'vlr_nominal': float(df['vlr_nominal'].sum()),
+        'taxa_inadimplencia': taxa_geral_inadimplencia,
+        'p99_vlr_nominal': p99_nominal,
+        'inadimplencia_outliers': outlier_inadimplencia,
+        'mes_pico': str(inadimplencia_mensal.idxmax()) if len(inadimplencia_mensal) else None,
+        'inadimplencia_mes_pico': float(inadimplencia_mensal.max()) if len(inadimplencia_mensal) else None,
+        'casos_extremos': n_extremos,
+        'correlacao_liquidez_sacado': float(correlacoes.loc['taxa_inadimplencia', 'sacado_indice_liquidez_1m']),
+    }
+    # Segmentos pequenos podem não ter correlação (NaN), que vira null no JSON
+    resumo = {chave: (valor if pd.notna(valor) else None) for chave, valor in resumo.items()}
+    with open(os.path.join(output_dir, SUMMARY_FILE), 'w') as f:
+        json.dump(resumo, f, indent=2, default=float)
+    return resumo
+
+
+def run_segment(dim, valor, boletos, output_dir, backend_name=None):
+    # Executado no worker; um segmento com erro não interrompe os demais e fica registrado no índice
+    inicio = time.perf_counter()
+    linha = {'segmento': segment_name(dim, valor), 'dimensao': dim, 'valor': valor, 'boletos': boletos}
+    try:
+        linha.update(segment_report(segment_data(_dados, dim, valor), output_dir, backend_name))
+        linha['erro'] = None
+    except Exception as e:
+        linha['erro'] = f'{type(e).__name__}: {e}'
+    linha['segundos'] = time.perf_counter() - inicio
+    return linha
+
+
+def run_segment_reports(dados, segmentos, output_dir, workers=None, backend_name=None, style='whitegrid'):
+    # Devolve o índice (uma linha por segmento) e o grava em output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = cache_dados.cache_path(dados.versao)
+    if dados.leitor is None:
+        # Carga a frio: os dados acabaram de ser preparados em memória; o recorte dos segmentos
+        # é feito sobre a tabela mapeada, então reabre o cache que acabou de ser publicado
+        dados = cache_dados.read_cache(cache_path, dados.versao)
+    tarefas = [(dim, valor, boletos, os.path.join(output_dir, segment_name(dim, valor)), backend_name) for dim, valor, boletos in segmentos]
+
+    if workers == 1:
+        # Execução serial no próprio processo, sobre o dataset já carregado
+        global _dados
+        _dados = dados
+        sns.set_style(style)
+        linhas = [run_segment(*tarefa) for tarefa in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_path, dados.versao, style)) as pool:
+            futures = [pool.submit(run_segment, *tarefa) for tarefa in tarefas]
+            linhas = [future.result() for future in as_completed(futures)]
+
+    # Colunas fixas: o índice existe mesmo quando todos os segmentos falham
+    indice = pd.DataFrame(linhas).reindex(columns=INDEX_COLUMNS).sort_values(['dimensao', 'boletos'], ascending=[False, False], ignore_index=True)
+    indice['diretorio'] = indice['segmento']
+    indice.to_csv(os.path.join(output_dir, INDEX_FILE), index=False)
+    return indice
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Relatório EDA por segmento (UF e divisões CNAE) - Desafio Fiap/Nuclea.')
+    parser.add_argument('--saida', default=OUTPUT_DIR, help='Diretório dos relatórios (um subdiretório por segmento).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos usados para os segmentos.')
+    parser.add_argument('--dimensoes', nargs='+', default=list(SEGMENT_DIMS), choices=list(SEGMENT_DIMS))
+    parser.add_argument('--top-cnae', type=int, default=TOP_CNAE, help='Divisões CNAE com mais boletos incluídas.')
+    parser.add_argument('--backend', default=motores_analise.BACKEND, choices=list(motores_analise.BACKENDS),
+                        help='Motor de consulta das agregações (padrão: NUCLEA_BACKEND ou pandas).')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    inicio = time.perf_counter()
+    # Carga e preparação únicas: os workers só abrem o cache gerado aqui
+    dados = analise_completa_final.load_and_prepare_data()
+    if dados is None:
+        return
+    segmentos = list_segments(dados, args.dimensoes, args.top_cnae)
+    carga = time.perf_counter() - inicio
+    print(f"{len(segmentos)} segmentos ({', '.join(args.dimensoes)}); dados carregados em {carga:.2f}s")
+
+    indice = run_segment_reports(dados, segmentos, args.saida, args.workers, args.backend)
+    total = time.perf_counter() - inicio - carga
+
+    colunas = ['segmento', 'boletos', 'pagadores', 'taxa_inadimplencia', 'mes_pico', 'casos_extremos', 'segundos']
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.2f}'.format):
+        print(indice[colunas].to_string(index=False))
+    for linha in indice[indice['erro'].notna()].itertuples():
+        print(f"Erro no segmento {linha.segmento}: {linha.erro}")
+
+    # Paralelismo efetivo: soma do tempo dos segmentos / tempo total (ideal = número de workers)
+    print(f"\nTempo total: {total:.2f}s; soma dos segmentos: {indice['segundos'].sum():.2f}s; "
+          f"paralelismo efetivo: {indice['segundos'].sum() / total:.2f}x com {args.workers} workers")
+    print(f"Índice: {os.path.join(args.saida, INDEX_FILE)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import cache_dados
+import diagnostico
+from preparacao_dados import PAYER_INDICATORS, STATUS_PAGO_ATRASADO, payer_rows
+
+# --- Score de risco por pagador ---
+# Regressão logística binomial sobre a tabela por pagador: para cada pagador, a probabilidade de
+# um boleto ficar em aberto, a partir dos indicadores da base auxiliar e do histórico de pagamento.
+# Os coeficientes são sobre variáveis padronizadas, então o peso de cada variável é comparável.
+# O ajuste (Newton-Raphson com penalidade L2) e o score são vetorizados em NumPy; o score é feito
+# em lotes para caber em memória com milhões de pagadores.
+# Os scores ficam em disco por versão dos dados e código do pagador. Numa carga incremental o
+# modelo da versão anterior é mantido e só os pagadores com boletos alterados são recalculados;
+# o modelo é reajustado quando a base completa muda.
+
+SCORE_DIR = os.path.join(cache_dados.CACHE_DIR, 'scores')
+MODEL_FILE = 'modelo.json'
+MEASURES_FILE = 'medidas.arrow'
+SCORES_FILE = 'scores.arrow'
+
+FACT_COLS = ['id_pagador', 'vlr_nominal', 'status_pagamento', 'dias_atraso', 'inadimplente']
+MEASURES = ['boletos', 'inadimplentes', 'vlr_nominal', 'pagos_atrasados', 'dias_atraso']
+FEATURES = list(PAYER_INDICATORS) + ['log_boletos', 'log_valor_medio', 'share_pago_atrasado', 'media_dias_atraso']
+
+L2_PENALTY = 1.0
+MAX_ITER = 50
+TOLERANCE = 1e-8
+SCORE_BATCH = 1_000_000
+
+
+@dataclass
+class LogisticModel:
+    # Padronização (média e desvio do ajuste) e coeficientes sobre as variáveis padronizadas
+    features: list
+    media: np.ndarray
+    desvio: np.ndarray
+    intercepto: float
+    coeficientes: np.ndarray
+
+    def predict(self, X, batch=SCORE_BATCH):
+        # Probabilidade de inadimplência por linha de X; valores ausentes entram como a média
+        X = np.asarray(X, dtype='float64')
+        prob = np.empty(len(X))
+        for inicio in range(0, len(X), batch):
+            z = (X[inicio:inicio + batch] - self.media) / self.desvio
+            z = np.nan_to_num(z, nan=0.0)
+            prob[inicio:inicio + batch] = _sigmoid(self.intercepto + z @ self.coeficientes)
+        return prob
+
+    def coefficients(self):
+        return pd.DataFrame({
+            'coeficiente': self.coeficientes,
+            'razao_chances': np.exp(self.coeficientes),
+        }, index=pd.Index(self.features, name='variavel')).sort_values('coeficiente', key=np.abs, ascending=False)
+
+    def to_dict(self):
+        return {
+            'features': self.features,
+            'media': self.media.tolist(),
+            'desvio': self.desvio.tolist(),
+            'intercepto': self.intercepto,
+            'coeficientes': self.coeficientes.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['features'], np.array(d['media']), np.array(d['desvio']), d['intercepto'], np.array(d['coeficientes']))
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def fit_model(X, inadimplentes, boletos, features=FEATURES, l2=L2_PENALTY):
+    # Logística binomial agregada: `inadimplentes` sucessos em `boletos` tentativas por linha
+    X = np.asarray(X, dtype='float64')
+    y = np.asarray(inadimplentes, dtype='float64')
+    n = np.asarray(boletos, dtype='float64')
+    media = np.nanmean(X, axis=0)
+    desvio = np.nanstd(X, axis=0)
+    desvio = np.where(desvio > 0, desvio, 1.0)
+    Z = np.column_stack([np.ones(len(X)), np.nan_to_num((X - media) / desvio, nan=0.0)])
+
+    beta = np.zeros(Z.shape[1])
+    beta[0] = np.log(y.sum() / (n.sum() - y.sum()))
+    penalidade = np.full(Z.shape[1], l2)
+    penalidade[0] = 0.0
+    for _ in range(MAX_ITER):
+        p = _sigmoid(Z @ beta)
+        gradiente = Z.T @ (y - n * p) - penalidade * beta
+        hessiana = (Z * (n * p * (1 - p))[:, None]).T @ Z + np.diag(penalidade)
+        passo = np.linalg.solve(hessiana, gradiente)
+        beta += passo
+        if np.abs(passo).max() < TOLERANCE:
+            break
+    return LogisticModel(list(features), media, desvio, float(beta[0]), beta[1:])
+
+
+@dataclass
+class PayerScores:
+    versao: str
+    modelo: LogisticModel
+    # Uma linha por código de pagador (0..n-1): medidas somadas dos boletos e o score
+    medidas: pd.DataFrame
+    scores: pd.DataFrame
+
+    def top(self, n=20):
+        # Pagadores com boletos e maior probabilidade de inadimplência
+        com_boletos = self.scores[self.medidas['boletos'].to_numpy() > 0]
+        return com_boletos.nlargest(n, 'prob_inadimplencia').join(self.medidas[['boletos', 'inadimplentes']])
+
+
+def payer_measures(df):
+    # Boletos com pagador malformado (código -1) não pertencem a nenhum pagador pontuável
+    df = df[df['id_pagador'].to_numpy() >= 0]
+    df = df.assign(pagos_atrasados=(df['status_pagamento'] == STATUS_PAGO_ATRASADO).to_numpy(dtype='int64'))
+    return df.groupby('id_pagador').agg(
+        boletos=('inadimplente', 'size'),
+        inadimplentes=('inadimplente', 'sum'),
+        vlr_nominal=('vlr_nominal', 'sum'),
+        pagos_atrasados=('pagos_atrasados', 'sum'),
+        dias_atraso=('dias_atraso', 'sum'),
+    )
+
+
+def feature_matrix(medidas, dimensao):
+    # Linhas de `medidas` (índice = código do pagador): indicadores da dimensão e histórico de pagamento
+    codes = medidas.index.to_numpy()
+    boletos = medidas['boletos'].to_numpy(dtype='float64')
+    com_boletos = np.where(boletos > 0, boletos, np.nan)
+    return np.column_stack([
+        payer_rows(dimensao[list(PAYER_INDICATORS.values())], codes).to_numpy(dtype='float64'),
+        np.log1p(boletos),
+        np.log1p(medidas['vlr_nominal'].to_numpy(dtype='float64') / com_boletos),
+        medidas['pagos_atrasados'].to_numpy(dtype='float64') / com_boletos,
+        medidas['dias_atraso'].to_numpy(dtype='float64') / com_boletos,
+    ])
+
+
+def _score_frame(prob, index):
+    return pd.DataFrame({
+        'prob_inadimplencia': prob,
+        # Escala de crédito: 1000 = menor risco
+        'score': np.round(1000 * (1 - prob)).astype('int64'),
+    }, index=index)
+
+
+def _dense(medidas, n_payers):
+    return medidas[MEASURES].reindex(pd.RangeIndex(n_payers, name='id_pagador'), fill_value=0).astype('float64')
+
+
+@diagnostico.timed('score: ajuste completo')
+def build_scores(dados):
+    medidas = _dense(payer_measures(dados.fact_columns(FACT_COLS)), len(dados.pagadores))
+    X = feature_matrix(medidas, dados.pagadores)
+    treino = medidas['boletos'].to_numpy() > 0
+    modelo = fit_model(X[treino], medidas['inadimplentes'].to_numpy()[treino], medidas['boletos'].to_numpy()[treino])
+    return PayerScores(dados.versao, modelo, medidas, _score_frame(modelo.predict(X), medidas.index))
+
+
+@diagnostico.timed('score: carga incremental')
+def update_scores(anterior, dados):
+    # Soma os boletos novos, subtrai os substituídos e recalcula só os pagadores tocados (e os novos)
+    delta = dados.delta
+    removidos = delta.removidos[FACT_COLS]
+    novos = delta.novos(dados.fact_columns(FACT_COLS))
+    n_payers = len(dados.pagadores)
+
+    medidas = _dense(anterior.medidas, n_payers)
+    medidas = medidas.add(payer_measures(novos), fill_value=0).sub(payer_measures(removidos), fill_value=0)
+    alterados = np.union1d(
+        np.union1d(novos['id_pagador'].to_numpy(), removidos['id_pagador'].to_numpy()),
+        np.arange(len(anterior.medidas), n_payers),
+    ).astype('int64')
+    alterados = alterados[alterados >= 0]
+
+    scores = anterior.scores.reindex(medidas.index)
+    novos_scores = _score_frame(anterior.modelo.predict(feature_matrix(medidas.iloc[alterados], dados.pagadores)), medidas.index[alterados])
+    scores.iloc[alterados] = novos_scores.to_numpy()
+    return PayerScores(dados.versao, anterior.modelo, medidas, scores.astype({'score': 'int64'}))
+
+
+def _path(versao, score_dir):
+    return os.path.join(score_dir, versao)
+
+
+def read_scores(versao, score_dir=SCORE_DIR):
+    path = _path(versao, score_dir)
+    if not os.path.exists(path):
+        return None
+    with open(os.path.join(path, MODEL_FILE)) as f:
+        modelo = LogisticModel.from_dict(json.load(f))
+    medidas = cache_dados.read_arrow(os.path.join(path, MEASURES_FILE)).to_pandas().rename_axis('id_pagador')
+    scores = cache_dados.read_arrow(os.path.join(path, SCORES_FILE)).to_pandas().rename_axis('id_pagador')
+    return PayerScores(versao, modelo, medidas, scores)
+
+
+def write_scores(tabela, score_dir=SCORE_DIR):
+    # Mesma troca atômica do cache dos dados; scores de outras versões são removidos
+    path = _path(tabela.versao, score_dir)
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    with open(os.path.join(tmp_path, MODEL_FILE), 'w') as f:
+        json.dump(tabela.modelo.to_dict(), f, indent=2)
+    cache_dados.write_arrow(pa.Table.from_pandas(tabela.medidas, preserve_index=False), os.path.join(tmp_path, MEASURES_FILE))
+    cache_dados.write_arrow(pa.Table.from_pandas(tabela.scores, preserve_index=False), os.path.join(tmp_path, SCORES_FILE))
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    for name in os.listdir(score_dir):
+        if name != tabela.versao and not name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(score_dir, name), ignore_errors=True)
+
+
+def scores_for(dados, score_dir=SCORE_DIR):
+    # Scores da versão em disco; senão, atualização a partir da versão anterior; senão, ajuste completo
+    tabela = read_scores(dados.versao, score_dir)
+    if tabela is not None:
+        return tabela
+    anterior = read_scores(dados.delta.parent, score_dir) if dados.delta is not None else None
+    tabela = update_scores(anterior, dados) if anterior is not None else build_scores(dados)
+    write_scores(tabela, score_dir)
+    return tabela
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# --- Séries temporais de inadimplência sobre arrays acumulados ---
+# Os boletos são contados uma única vez por dia de emissão (np.bincount) e guardados como somas
+# acumuladas, em ordem de data. A soma de qualquer intervalo de dias é a diferença de duas
+# posições do acumulado: agregações diárias, semanais e mensais e janelas móveis custam O(1) por
+# ponto, sem novo groupby. As curvas de safra (mês de emissão × dias de atraso) usam o mesmo
+# recurso: um histograma de dias de atraso por safra, acumulado ao longo do atraso.
+
+FACT_COLS = ['dt_emissao', 'dt_vencimento', 'dt_pagamento', 'vlr_nominal', 'inadimplente']
+
+GRANULARITIES = {'D': 'Diária', 'W': 'Semanal', 'M': 'Mensal'}
+MESES = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro',
+         'Outubro', 'Novembro', 'Dezembro']
+
+# Atrasos acima do limite ficam no último dia da curva; boletos em aberto nunca saem dela
+MAX_DIAS_ATRASO = 180
+# Picos: z-score robusto (mediana e desvio absoluto mediano) acima do limiar, só em períodos
+# com boletos suficientes para a taxa ser estável
+LIMIAR_PICO = 3.5
+MIN_BOLETOS_PERIODO = 30
+MAD_SCALE = 1.4826
+
+
+def format_period(periodo):
+    if periodo.freqstr.startswith('M'):
+        return f'{MESES[periodo.month - 1]}/{periodo.year}'
+    if periodo.freqstr.startswith('W'):
+        return f'semana de {periodo.start_time:%d/%m/%Y}'
+    return f'{periodo.start_time:%d/%m/%Y}'
+
+
+class TimeSeries:
+
+    def __init__(self, dias, acumulados, safras, atraso_acumulado):
+        # dias: DatetimeIndex contínuo do primeiro ao último dia de emissão
+        # acumulados: {medida: array com len(dias) + 1 posições, começando em 0}
+        # safras: PeriodIndex mensal; atraso_acumulado: (safras, MAX_DIAS_ATRASO + 3) boletos
+        # pagos até cada dia de atraso, acumulados (coluna 0 = nenhum, última = total da safra)
+        self.dias = dias
+        self.acumulados = acumulados
+        self.safras = safras
+        self.atraso_acumulado = atraso_acumulado
+
+    def _bounds(self, freq):
+        # Posições (início, fim) de cada período da granularidade nos arrays diários
+        periodos = self.dias.to_period(freq)
+        inicios = np.flatnonzero(np.r_[True, periodos[1:] != periodos[:-1]])
+        fins = np.r_[inicios[1:], len(self.dias)]
+        return periodos[inicios], inicios, fins
+
+    def _window(self, inicios, fins):
+        sums = pd.DataFrame({medida: acumulado[fins] - acumulado[inicios] for medida, acumulado in self.acumulados.items()})
+        sums['taxa_inadimplencia'] = sums['inadimplentes'] / sums['boletos'].where(sums['boletos'] > 0) * 100
+        return sums
+
+    def resample(self, freq='M'):
+        # Medidas e taxa de inadimplência (%) por período de emissão; períodos sem boletos têm taxa nula
+        periodos, inicios, fins = self._bounds(freq)
+        return self._window(inicios, fins).set_axis(pd.PeriodIndex(periodos, name='periodo'))
+
+    def rolling(self, freq='M', janela=1):
+        # Janela móvel de `janela` períodos terminando em cada período
+        periodos, inicios, fins = self._bounds(freq)
+        primeiros = np.maximum(np.arange(len(inicios)) - janela + 1, 0)
+        return self._window(inicios[primeiros], fins).set_axis(pd.PeriodIndex(periodos, name='periodo'))
+
+    def default_rate(self, freq='M', janela=1):
+        serie = self.rolling(freq, janela)
+        return serie.loc[serie['boletos'] > 0, 'taxa_inadimplencia']
+
+    def detect_peaks(self, freq='M', janela=1, limiar=LIMIAR_PICO, min_boletos=MIN_BOLETOS_PERIODO):
+        # Períodos com taxa (na janela móvel) anormalmente alta, do mais para o menos atípico
+        serie = self.rolling(freq, janela)
+        serie = serie[serie['boletos'] >= min_boletos]
+        taxas = serie['taxa_inadimplencia']
+        mediana = taxas.median()
+        desvio = (taxas - mediana).abs().median() * MAD_SCALE
+        if not desvio > 0:
+            # Desvio absoluto mediano nulo (metade dos períodos com a mesma taxa): usa o desvio médio
+            desvio = (taxas - mediana).abs().mean() * np.sqrt(np.pi / 2)
+        if not desvio > 0:
+            return serie.assign(z=pd.Series(dtype=float)).iloc[:0]
+        serie = serie.assign(z=(taxas - mediana) / desvio)
+        return serie[serie['z'] > limiar].sort_values('z', ascending=False)
+
+    def vintage(self, max_dias=MAX_DIAS_ATRASO, min_boletos=MIN_BOLETOS_PERIODO):
+        # % dos boletos de cada safra (mês de emissão) ainda não pagos d dias após o vencimento.
+        # Safras recentes tiveram menos tempo de observação: o fim das curvas delas é parcial.
+        max_dias = min(max_dias, MAX_DIAS_ATRASO)
+        total = self.atraso_acumulado[:, -1]
+        pagos = self.atraso_acumulado[:, 1:max_dias + 2]
+        curvas = (total[:, None] - pagos) / np.where(total > 0, total, np.nan)[:, None] * 100
+        curvas = pd.DataFrame(curvas, index=self.safras, columns=pd.RangeIndex(max_dias + 1, name='dias_atraso'))
+        return curvas[total >= min_boletos]
+
+
+def _cumulative(values):
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+def build_time_series(df):
+    # df: colunas de FACT_COLS; boletos sem data de emissão ficam de fora
+    emissao = df['dt_emissao'].to_numpy(dtype='datetime64[D]')
+    validos = ~np.isnat(emissao)
+    emissao = emissao[validos]
+    inadimplente = df['inadimplente'].to_numpy()[validos].astype(bool)
+    inicio = emissao.min()
+    offset = (emissao - inicio).astype(np.int64)
+    n_dias = int(offset.max()) + 1
+
+    diarios = {
+        'boletos': np.bincount(offset, minlength=n_dias),
+        'inadimplentes': np.bincount(offset[inadimplente], minlength=n_dias),
+        'vlr_nominal': np.bincount(offset, weights=df['vlr_nominal'].to_numpy(dtype=float)[validos], minlength=n_dias),
+    }
+    dias = pd.date_range(pd.Timestamp(inicio), periods=n_dias, freq='D')
+
+    # Safras: histograma de dias de atraso por mês de emissão. Pagamentos antecipados contam como
+    # atraso 0; boletos em aberto (ou sem data de pagamento) ficam na última coluna, nunca pagos.
+    safra_codes, safras = pd.factorize(pd.PeriodIndex(emissao, freq='M'), sort=True)
+    atraso = (df['dt_pagamento'] - df['dt_vencimento']).dt.days.to_numpy(dtype=float)[validos]
+    nunca_pago = inadimplente | np.isnan(atraso)
+    coluna = np.where(nunca_pago, MAX_DIAS_ATRASO + 1, np.clip(np.nan_to_num(atraso), 0, MAX_DIAS_ATRASO)).astype(np.int64)
+    largura = MAX_DIAS_ATRASO + 2
+    histograma = np.bincount(safra_codes * largura + coluna, minlength=len(safras) * largura).reshape(len(safras), largura)
+    atraso_acumulado = np.concatenate([np.zeros((len(safras), 1), dtype=np.int64), np.cumsum(histograma, axis=1)], axis=1)
+
+    return TimeSeries(dias, {medida: _cumulative(valores) for medida, valores in diarios.items()}, pd.PeriodIndex(safras, name='safra'), atraso_acumulado)
@@ -0,0 +1,137 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# --- Sketch de quantis com erro relativo garantido (no estilo DDSketch) ---
+# Cada valor cai num bucket logarítmico; o quantil devolvido fica a no máximo
+# `relative_accuracy` (relativo) do valor exato de mesmo rank. Os buckets são contagens,
+# então sketches de blocos ou partições diferentes se combinam somando as contagens.
+
+RELATIVE_ACCURACY = 0.001
+
+
+class _Store:
+    # Contagens densas por chave de bucket, a partir de `offset`
+
+    def __init__(self):
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.offset = 0
+
+    def add(self, keys, counts):
+        if len(keys) == 0:
+            return
+        lo, hi = int(keys.min()), int(keys.max())
+        if len(self.counts) == 0:
+            self.offset = lo
+            self.counts = np.zeros(hi - lo + 1, dtype=np.int64)
+        else:
+            new_lo = min(lo, self.offset)
+            new_hi = max(hi, self.offset + len(self.counts) - 1)
+            if new_lo < self.offset or new_hi >= self.offset + len(self.counts):
+                grown = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+                grown[self.offset - new_lo:self.offset - new_lo + len(self.counts)] = self.counts
+                self.counts, self.offset = grown, new_lo
+        np.add.at(self.counts, keys - self.offset, counts)
+
+    def merge(self, other):
+        nonzero = np.flatnonzero(other.counts)
+        self.add(nonzero + other.offset, other.counts[nonzero])
+
+    def keys(self):
+        return np.arange(self.offset, self.offset + len(self.counts))
+
+
+class QuantileSketch:
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy deve estar entre 0 e 1')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._positive = _Store()
+        self._negative = _Store()
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _keys(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+
+    def _value(self, key):
+        # Ponto do bucket que minimiza o erro relativo
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _add(self, values, sign):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        for store, magnitudes in ((self._positive, values[values > 0]), (self._negative, -values[values < 0])):
+            keys, counts = np.unique(self._keys(magnitudes), return_counts=True)
+            store.add(keys, sign * counts)
+        self.zero_count += sign * int((values == 0).sum())
+        self.count += sign * len(values)
+        return self
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self._add(values, 1)
+        self.min = min(self.min, np.nanmin(values, initial=np.inf))
+        self.max = max(self.max, np.nanmax(values, initial=-np.inf))
+        return self
+
+    def remove(self, values):
+        # Retira valores já contados (ex.: boletos substituídos numa carga incremental).
+        # min/max ficam como estavam: são só limites para os quantis extremos.
+        return self._add(values, -1)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Só é possível combinar sketches com a mesma precisão')
+        self._positive.merge(other._positive)
+        self._negative.merge(other._negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        # Aceita um escalar ou uma sequência de quantis
+        if self.count == 0:
+            return np.nan
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        if ((qs < 0) | (qs > 1)).any():
+            raise ValueError('Quantis devem estar entre 0 e 1')
+
+        # Valores de todos os buckets em ordem crescente: negativos, zero, positivos
+        neg_keys = self._negative.keys()[::-1]
+        values = np.concatenate([-self._value(neg_keys), [0.0], self._value(self._positive.keys())])
+        counts = np.concatenate([self._negative.counts[::-1], [self.zero_count], self._positive.counts])
+
+        # Interpolação linear entre os ranks vizinhos, como o quantil padrão do pandas/NumPy
+        ranks = qs * (self.count - 1)
+        cumulative = np.cumsum(counts)
+        lower = np.clip(values[np.searchsorted(cumulative, np.floor(ranks), side='right')], self.min, self.max)
+        upper = np.clip(values[np.searchsorted(cumulative, np.ceil(ranks), side='right')], self.min, self.max)
+        result = lower + (ranks - np.floor(ranks)) * (upper - lower)
+        return result if np.ndim(q) else float(result[0])
+
+
+def sketch_of(values, relative_accuracy=RELATIVE_ACCURACY):
+    return QuantileSketch(relative_accuracy).update(values)
+
+
+def sketches_by(values, groups, relative_accuracy=RELATIVE_ACCURACY):
+    # Um sketch por valor de `groups` (ex.: por UF), combináveis entre si para uniões de segmentos
+    # Os grupos mantêm o dtype original (Period, categoria): converter para array de objetos é caro
+    groups = pd.Series(groups).reset_index(drop=True)
+    values = pd.Series(np.asarray(values, dtype=float))
+    return {
+        group: sketch_of(group_values.to_numpy(), relative_accuracy)
+        for group, group_values in values.groupby(groups, observed=True, sort=True)
+    }
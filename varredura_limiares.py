@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# --- Varredura de limiares por pagador ---
+# "Casos extremos" (liquidez do sacado abaixo de X e taxa de inadimplência até Y) e a divisão em
+# grupos de risco (taxa acima de Y) dependem de limiares. Os indicadores por pagador são ordenados
+# uma única vez; a grade inteira de limiares sai de uma passada vetorizada (posição de cada
+# pagador na grade + contagens acumuladas nos dois eixos), sem recalcular a agregação por pagador.
+
+LIMITES_LIQUIDEZ = np.round(np.arange(0.05, 1.0001, 0.05), 2)
+LIMITES_TAXA = np.round(np.arange(0, 1.0001, 0.05), 2)
+
+
+class ThresholdSweep:
+
+    def __init__(self, liquidez, taxa):
+        # Pagadores sem liquidez ou sem taxa nunca entram nos casos extremos (comparações com nulo são falsas)
+        liquidez = np.asarray(liquidez, dtype='float64')
+        taxa = np.asarray(taxa, dtype='float64')
+        validos = ~(np.isnan(liquidez) | np.isnan(taxa))
+        ordem = np.argsort(liquidez[validos], kind='stable')
+        self.liquidez = liquidez[validos][ordem]
+        self.taxa_por_liquidez = taxa[validos][ordem]
+        self.taxas = np.sort(taxa[~np.isnan(taxa)])
+
+    def extreme_cases(self, limite_liquidez, limite_taxa=0.0):
+        # Pagadores com liquidez < limite_liquidez e taxa <= limite_taxa
+        fim = np.searchsorted(self.liquidez, limite_liquidez, side='left')
+        return int((self.taxa_por_liquidez[:fim] <= limite_taxa).sum())
+
+    def grid(self, limites_liquidez=LIMITES_LIQUIDEZ, limites_taxa=LIMITES_TAXA):
+        # contagens[i, j] = pagadores com liquidez < limites_liquidez[i] e taxa <= limites_taxa[j]
+        limites_liquidez = np.sort(np.asarray(limites_liquidez, dtype='float64'))
+        limites_taxa = np.sort(np.asarray(limites_taxa, dtype='float64'))
+        nx, ny = len(limites_liquidez), len(limites_taxa)
+
+        # Primeiro limite de cada eixo que inclui o pagador (nx / ny = nenhum)
+        fins = np.searchsorted(self.liquidez, limites_liquidez, side='left')
+        faixa_x = np.searchsorted(fins, np.arange(len(self.liquidez)), side='right')
+        faixa_y = np.searchsorted(limites_taxa, self.taxa_por_liquidez, side='left')
+        histograma = np.bincount(faixa_x * (ny + 1) + faixa_y, minlength=(nx + 1) * (ny + 1)).reshape(nx + 1, ny + 1)
+        contagens = histograma.cumsum(axis=0).cumsum(axis=1)[:nx, :ny]
+        return pd.DataFrame(contagens, index=pd.Index(limites_liquidez, name='limite_liquidez'),
+                            columns=pd.Index(limites_taxa, name='limite_taxa'))
+
+    def high_risk(self, limites_taxa=LIMITES_TAXA):
+        # Pagadores no grupo "Alto Risco" (taxa > limite) para cada limite
+        limites_taxa = np.asarray(limites_taxa, dtype='float64')
+        acima = len(self.taxas) - np.searchsorted(self.taxas, limites_taxa, side='right')
+        return pd.Series(acima, index=pd.Index(limites_taxa, name='limite_taxa'), name='alto_risco')
+
+
+def build_sweep(pagadores):
+    # pagadores: tabela por pagador com taxa_inadimplencia e sacado_indice_liquidez_1m (ex.: AggregateCube.pagadores)
+    return ThresholdSweep(pagadores['sacado_indice_liquidez_1m'], pagadores['taxa_inadimplencia'])
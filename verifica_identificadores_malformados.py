@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+import concentracao_exposicao
+import correlacao_segmentos
+import cubo_agregados
+import ingestao_streaming
+import motores_analise
+import paridade_backends
+import preparacao_dados
+import relatorio_segmentos
+import score_pagadores
+
+# --- Identificadores malformados ---
+# Um boleto com id_pagador malformado e outro com id_beneficiario malformado recebem código -1
+# (identificadores.IdentifierDictionary.from_hex). Confere que esse código nunca é usado como
+# posição na dimensão de pagadores: atributos nulos, como no merge à esquerda, e nenhuma etapa
+# quebra (matriz esparsa, correlações, score, segmentos, leitura em blocos). Um id_cnpj repetido
+# na base auxiliar fica com a primeira linha, na preparação e na leitura em blocos.
+
+MALFORMADO = 'z' * 64
+
+
+def corrupted_sources():
+    df_boletos, df_auxiliar = preparacao_dados.read_sources()
+    df_boletos.loc[0, 'id_pagador'] = MALFORMADO
+    df_boletos.loc[1, 'id_beneficiario'] = MALFORMADO
+    # Cadastro repetido, com atributos diferentes na segunda linha
+    repetido = df_auxiliar.iloc[[0]].assign(uf='XX')
+    return df_boletos, pd.concat([df_auxiliar, repetido], ignore_index=True)
+
+
+def check(nome, func):
+    try:
+        erro = func()
+    except Exception as e:
+        erro = f'{type(e).__name__}: {e}'
+    print(f"{nome}: {'OK' if not erro else erro}")
+    return not erro
+
+
+def main():
+    df_boletos, df_auxiliar = corrupted_sources()
+    brutos = df_boletos.copy()
+    dados = preparacao_dados.prepare_data(df_boletos, df_auxiliar)
+    dados.boletos = preparacao_dados.add_derived_columns(dados.boletos)
+    assert dados.boletos.loc[0, 'id_pagador'] == -1 and dados.boletos.loc[1, 'id_beneficiario'] == -1
+
+    def payer_attributes():
+        linha = dados.with_payer_columns(dados.boletos.iloc[:1], ['uf', 'cnae_4digitos', 'sacado_indice_liquidez_1m'])
+        if linha.iloc[0][['uf', 'cnae_4digitos', 'sacado_indice_liquidez_1m']].notna().any():
+            return f"atributos de outro pagador: {linha.iloc[0].to_dict()}"
+
+    def backends():
+        referencia = paridade_backends.run_analyses(motores_analise.get_backend(dados, 'pandas'))
+        agregado = referencia['agregação por pagador']
+        if agregado.loc[agregado['id_pagador'] == -1, list(preparacao_dados.PAYER_INDICATORS)].notna().any(axis=None):
+            return "indicadores preenchidos para o pagador malformado"
+        for name in motores_analise.BACKENDS:
+            try:
+                resultados = paridade_backends.run_analyses(motores_analise.get_backend(dados, name))
+            except ImportError:
+                continue
+            for analise in referencia:
+                erro = paridade_backends.compare(analise, referencia[analise], resultados[analise])
+                if erro:
+                    return f"{name}, {analise}: {erro}"
+
+    def cube():
+        cubo = cubo_agregados.build_cube(dados)
+        if cubo.pagadores.loc[-1, list(preparacao_dados.PAYER_INDICATORS)].notna().any():
+            return "indicadores preenchidos para o pagador malformado"
+
+    def exposure():
+        matriz = concentracao_exposicao.build_exposure(dados)
+        validos = (dados.boletos['id_pagador'] >= 0) & (dados.boletos['id_beneficiario'] >= 0)
+        total = matriz.concentration('pagador')['valor'].sum()
+        if not np.isclose(total, dados.boletos.loc[validos, 'vlr_nominal'].sum()):
+            return f"valor na matriz ({total:,.2f}) diferente dos boletos com par válido"
+
+    def correlation():
+        engine = correlacao_segmentos.build_correlation_engine(dados)
+        matriz = correlacao_segmentos._matrix(engine.segmentos['uf'].medidas.loc[[-1]], dados.pagadores)
+        if not np.isnan(matriz[:, 1:]).all():
+            return "indicadores preenchidos para o pagador malformado"
+
+    def scores():
+        tabela = score_pagadores.build_scores(dados)
+        if len(tabela.scores) != len(dados.pagadores):
+            return f"{len(tabela.scores)} scores para {len(dados.pagadores)} pagadores"
+
+    def segments():
+        segmentos = relatorio_segmentos.list_segments(dados, ['uf'])
+        com_uf = dados.with_payer_columns(dados.boletos[['id_pagador']], ['uf'])['uf'].notna().sum()
+        if sum(boletos for _, _, boletos in segmentos) != com_uf:
+            return "boletos do pagador malformado contados em alguma UF"
+
+    def duplicates():
+        codigo = dados.identifiers['id_pagador'].encode(df_auxiliar['id_cnpj'].iloc[[0]])[0]
+        agregados = ingestao_streaming.StreamingAggregates(df_auxiliar.copy())
+        ufs = {dados.pagadores.loc[codigo, 'uf'], agregados.auxiliar.loc[agregados.payers.encode(df_auxiliar['id_cnpj'].iloc[[0]])[0], 'uf']}
+        if ufs != {df_auxiliar['uf'].iloc[0]}:
+            return f"UF do cadastro repetido: {ufs}"
+
+    def streaming():
+        agregados = ingestao_streaming.StreamingAggregates(df_auxiliar.copy())
+        agregados.update(brutos[ingestao_streaming.STREAM_COLS].copy())
+        if agregados.n_boletos != len(brutos):
+            return f"{agregados.n_boletos} boletos lidos de {len(brutos)}"
+
+    verificacoes = {
+        'atributos do pagador': payer_attributes,
+        'motores de análise': backends,
+        'cubo de agregados': cube,
+        'matriz pagador × beneficiário': exposure,
+        'correlações por segmento': correlation,
+        'score de pagadores': scores,
+        'segmentos do relatório': segments,
+        'leitura em blocos': streaming,
+        'cadastro repetido': duplicates,
+    }
+    ok = all([check(nome, func) for nome, func in verificacoes.items()])
+    print("\nIdentificadores malformados tratados como pagador sem cadastro." if ok else "\nHá etapas que usam o código -1 como posição.")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import gc
+import os
+import tempfile
+
+# --- Reuso do dataset preparado entre reruns do dashboard ---
+# Renderiza o app sem navegador (AppTest), passa por todas as páginas e repete os reruns, contando
+# os objetos PreparedData vivos no processo. O dataset deve ser um único objeto, o mesmo em todos os
+# reruns, inclusive na primeira execução com o cache vazio (padrão: diretório de cache temporário).
+
+
+def live_datasets():
+    from preparacao_dados import PreparedData
+
+    gc.collect()
+    return {id(obj) for obj in gc.get_objects() if isinstance(obj, PreparedData)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica se os reruns do app reaproveitam o mesmo dataset preparado.')
+    parser.add_argument('--cache-dir', default=None, help='Diretório do cache (padrão: temporário, vazio).')
+    parser.add_argument('--reruns', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    # Antes de qualquer import do projeto: cache_dados lê o diretório do cache na importação
+    os.environ['NUCLEA_CACHE_DIR'] = args.cache_dir or tempfile.mkdtemp(prefix='nuclea_cache_')
+
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app_streamlit.py'), default_timeout=args.timeout)
+    app.run()
+    if app.exception:
+        raise SystemExit(f"Primeira execução falhou: {app.exception}")
+    esperado = live_datasets()
+    print(f"Primeira execução: {len(esperado)} dataset(s) em memória")
+
+    ok = len(esperado) == 1
+    for rodada in range(args.reruns):
+        for page in app.sidebar.radio[0].options:
+            app.sidebar.radio[0].set_value(page).run()
+            if app.exception:
+                raise SystemExit(f"Página {page} falhou: {app.exception}")
+            vivos = live_datasets()
+            if vivos != esperado:
+                print(f"   rerun {rodada + 1}, {page}: {len(vivos)} dataset(s), {'mesmo objeto' if vivos >= esperado else 'objeto novo'}")
+                ok = False
+
+    print("Todos os reruns reaproveitaram o mesmo dataset." if ok else "Há reruns com o dataset recarregado ou duplicado.")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()